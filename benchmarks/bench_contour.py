@@ -0,0 +1,77 @@
+"""
+Benchmark the mask contour at large scales
+==========================================
+
+Renders a masked word cloud with a contour at increasing ``scale`` and reports
+the time of the first ``to_image`` (which computes the contour), of a second
+one after ``recolor`` (which reuses the cached contour) and the peak memory
+used by rendering. Every scale is run in a fresh process so that the peak
+resident set size of one run doesn't hide the next one.
+
+Usage::
+
+    $ python benchmarks/bench_contour.py --scales 1 2 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from wordcloud import WordCloud
+
+HERE = os.path.dirname(__file__)
+
+
+def _max_rss():
+    """Peak resident set size of this process in MB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10)
+
+
+def run(scale, contour_width, max_words):
+    text = open(os.path.join(HERE, '..', 'examples', 'alice.txt')).read()
+    mask = np.array(Image.open(os.path.join(HERE, '..', 'examples',
+                                            'alice_mask.png')))
+    wc = WordCloud(mask=mask, scale=scale, contour_width=contour_width,
+                   contour_color='steelblue', max_words=max_words,
+                   random_state=0).generate(text)
+    before = _max_rss()
+    start = time.perf_counter()
+    wc.to_image()
+    first = time.perf_counter() - start
+    peak = _max_rss() - before
+    wc.recolor(random_state=1)
+    start = time.perf_counter()
+    wc.to_image()
+    second = time.perf_counter() - start
+    width, height = wc._image_size()
+    return width, height, first, second, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--scales', type=float, nargs='+',
+                        default=[1, 2, 4, 8])
+    parser.add_argument('--contour_width', type=float, default=3)
+    parser.add_argument('--max_words', type=int, default=200)
+    args = parser.parse_args()
+
+    print("%-12s %12s %12s %12s %14s" % ("scale", "pixels", "first (ms)",
+                                         "cached (ms)", "peak mem (MB)"))
+    for scale in args.scales:
+        with multiprocessing.Pool(1) as pool:
+            width, height, first, second, peak = pool.apply(
+                run, (scale, args.contour_width, args.max_words))
+        print("%-12g %12s %12.1f %12.1f %14.1f"
+              % (scale, "%dx%d" % (width, height), 1000 * first,
+                 1000 * second, peak))
+
+
+if __name__ == '__main__':
+    main()
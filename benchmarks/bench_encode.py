@@ -0,0 +1,78 @@
+"""
+Benchmark image encoding options
+================================
+
+Generates one word cloud and reports the time to render and encode it with
+``to_file`` against the size of the output, for PNG with and without
+optimization, JPEG, lossy and lossless WebP, and the band by band PNG writer.
+Each run renders the image again, as the band by band writer renders the
+bands it writes; the first row is the time of rendering alone.
+
+Usage::
+
+    $ python benchmarks/bench_encode.py --width 3840 --height 2160
+"""
+import argparse
+import io
+import os
+import time
+
+from wordcloud import WordCloud
+
+HERE = os.path.dirname(__file__)
+
+OPTIONS = [
+    ("png optimize (default)", dict(format="png")),
+    ("png compress_level=9", dict(format="png", compress_level=9)),
+    ("png compress_level=6", dict(format="png", compress_level=6)),
+    ("png compress_level=1", dict(format="png", compress_level=1)),
+    ("png compress_level=0", dict(format="png", compress_level=0)),
+    ("png band_height=256", dict(format="png", band_height=256)),
+    ("jpeg quality=90", dict(format="jpeg", quality=90)),
+    ("webp quality=80", dict(format="webp", quality=80)),
+    ("webp quality=80 no optimize", dict(format="webp", quality=80,
+                                         optimize=False)),
+    ("webp lossless", dict(format="webp", lossless=True, optimize=False)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--max_words', type=int, default=1000)
+    parser.add_argument('--n_iter', type=int, default=3)
+    args = parser.parse_args()
+
+    text = open(os.path.join(HERE, '..', 'examples', 'alice.txt')).read()
+    wc = WordCloud(width=args.width, height=args.height,
+                   max_words=args.max_words, random_state=0).generate(text)
+    # fill the sprite cache, so that only drawing them is timed
+    wc.to_image()
+    print("%d x %d pixels, %d words" % (args.width, args.height,
+                                        len(wc.layout_)))
+    print("%-30s %10s %10s"
+          % ("render + encoding", "time (ms)", "size (kB)"))
+    elapsed = 0
+    for i in range(args.n_iter):
+        # a new layout list invalidates the rendered image
+        wc.layout_ = list(wc.layout_)
+        start = time.perf_counter()
+        wc.to_image()
+        elapsed += time.perf_counter() - start
+    print("%-30s %10.1f %10s" % ("render only", 1000 * elapsed / args.n_iter,
+                                 "-"))
+    for name, options in OPTIONS:
+        elapsed = 0
+        for i in range(args.n_iter):
+            wc.layout_ = list(wc.layout_)
+            buffer = io.BytesIO()
+            start = time.perf_counter()
+            wc.to_file(buffer, **options)
+            elapsed += time.perf_counter() - start
+        print("%-30s %10.1f %10.1f" % (name, 1000 * elapsed / args.n_iter,
+                                       len(buffer.getvalue()) / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark recoloring and rendering an existing layout
+======================================================
+
+Times ``recolor`` followed by ``to_image`` on a fixed layout, which only
+blends the cached word sprites, against drawing every word again with
+``ImageDraw.text``.
+
+Usage::
+
+    $ python benchmarks/bench_recolor.py --scale 2 --n_iter 20
+"""
+import argparse
+import os
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from wordcloud import WordCloud
+
+HERE = os.path.dirname(__file__)
+
+
+def draw_text_image(wc):
+    """Reference rendering, loading the font and drawing each word."""
+    img = Image.new(wc.mode, (int(wc.width * wc.scale),
+                              int(wc.height * wc.scale)), wc.background_color)
+    draw = ImageDraw.Draw(img)
+    for (word, count), font_size, position, orientation, color in wc.layout_:
+        font = ImageFont.truetype(wc.font_path, int(font_size * wc.scale))
+        transposed_font = ImageFont.TransposedFont(font,
+                                                   orientation=orientation)
+        pos = (int(position[1] * wc.scale), int(position[0] * wc.scale))
+        draw.text(pos, word, fill=color, font=transposed_font)
+    return img
+
+
+def bench(name, func, n_iter):
+    start = time.perf_counter()
+    for i in range(n_iter):
+        func(i)
+    elapsed = (time.perf_counter() - start) / n_iter
+    print("%-28s %8.2f ms" % (name, 1000 * elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--max_words', type=int, default=2000)
+    parser.add_argument('--n_iter', type=int, default=10)
+    args = parser.parse_args()
+
+    text = open(os.path.join(HERE, '..', 'examples', 'alice.txt')).read()
+    wc = WordCloud(width=800, height=600, max_words=args.max_words,
+                   scale=args.scale, random_state=0).generate(text)
+    print("%d words, scale %g" % (len(wc.layout_), args.scale))
+    # first rendering fills the sprite cache
+    wc.to_image()
+
+    bench("recolor", lambda i: wc.recolor(random_state=i), args.n_iter)
+    bench("recolor + to_image", lambda i: wc.recolor(random_state=i).to_image(),
+          args.n_iter)
+    bench("recolor + ImageDraw.text",
+          lambda i: draw_text_image(wc.recolor(random_state=i)), args.n_iter)
+
+
+if __name__ == '__main__':
+    main()
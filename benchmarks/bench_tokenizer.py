@@ -0,0 +1,106 @@
+"""
+Benchmark tokenizers segmenting CJK text
+========================================
+
+Counts the words of the Chinese example text (``examples/wc_cn``, repeated),
+segmented by a stub segmenter standing in for jieba, which isn't needed to
+run the benchmark:
+
+* "join + regexp": segment the text, join the words with spaces and tokenize
+  them again with ``regexp``, as the Chinese examples used to do;
+* "tokenizer": pass the segmenter as ``tokenizer``;
+* "batch": pass a segmenter with a ``batch`` method;
+* "n_jobs=N": also segment parts of the text in N worker processes.
+
+All give the same word frequencies. Each row is the shortest of ``--n_runs``
+runs after a warm-up run. The stub is cheap, so the times show the overhead
+around the segmenter; a real segmenter adds the same segmentation time to
+every row, divided by the number of processes for the last one.
+
+Usage::
+
+    $ python benchmarks/bench_tokenizer.py --repeat 20 --n_jobs 2
+"""
+import argparse
+import gc
+import io
+import os
+import re
+import time
+
+from wordcloud import WordCloud
+
+HERE = os.path.dirname(__file__)
+
+
+class StubSegmenter(object):
+    """Split runs of Han characters in words of two characters, and keep
+    other words, whitespace and punctuation as tokens, like jieba.lcut."""
+    _pattern = re.compile(r"[一-鿿]{1,2}|\w+|\s+|\S")
+
+    def __call__(self, text):
+        return self._pattern.findall(text)
+
+
+class BatchStubSegmenter(StubSegmenter):
+    """Stub segmenter segmenting lists of texts at once."""
+
+    def batch(self, texts):
+        findall = self._pattern.findall
+        return [findall(text) for text in texts]
+
+
+def best_time(function, n_runs):
+    """Shortest time of n_runs calls, without garbage collection like
+    timeit, and the result."""
+    times = []
+    result = function()
+    gc.disable()
+    try:
+        for _ in range(n_runs):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='number of copies of the example text')
+    parser.add_argument('--n_jobs', type=int, default=2)
+    parser.add_argument('--n_runs', type=int, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(HERE, '..', 'examples', 'wc_cn', 'CalltoArms.txt')
+    with io.open(path, encoding='utf-8') as f:
+        text = f.read() * args.repeat
+    segmenter = StubSegmenter()
+    wc = WordCloud(min_word_length=2)
+    wc_tokenizer = WordCloud(min_word_length=2, tokenizer=segmenter)
+    wc_batch = WordCloud(min_word_length=2, tokenizer=BatchStubSegmenter())
+    runs = [
+        ("join + regexp",
+         lambda: wc.process_text(' '.join(segmenter(text)))),
+        ("tokenizer", lambda: wc_tokenizer.process_text(text)),
+        ("batch", lambda: wc_batch.process_text(text)),
+    ]
+    if args.n_jobs != 1:
+        runs.append(("n_jobs=%d" % args.n_jobs,
+                     lambda: wc_tokenizer.process_text(text,
+                                                       n_jobs=args.n_jobs)))
+
+    print("%d characters" % len(text))
+    print("%-16s %12s %8s" % ("", "time (ms)", "same"))
+    expected = None
+    for name, function in runs:
+        duration, words = best_time(function, args.n_runs)
+        if expected is None:
+            expected = words
+        print("%-16s %12.1f %8s" % (name, 1000 * duration, words == expected))
+
+
+if __name__ == '__main__':
+    main()
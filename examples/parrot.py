@@ -14,22 +14,11 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.ndimage import gaussian_gradient_magnitude
 
-from wordcloud import WordCloud, ImageColorGenerator
+from wordcloud import WordCloud, ImageColorGenerator, STOPWORDS
 
-def jieba_processing_txt(text, stopwords_path=None, userdict_list=None):
-    if userdict_list:
-        for word in userdict_list:
-            jieba.add_word(word)
-
-    seg_list = jieba.cut(text, cut_all=False)
-    words = [w.strip() for w in seg_list if len(w.strip()) > 1]
-
-    if stopwords_path:
-        with open(stopwords_path, encoding='utf-8') as f:
-            stopwords = set(f.read().splitlines())
-        words = [w for w in words if w not in stopwords]
-
-    return ' '.join(words)
+def load_stopwords(stopwords_path):
+    with open(stopwords_path, encoding='utf-8') as f:
+        return STOPWORDS | set(f.read().splitlines())
 
 # get data directory (using getcwd() is needed to support running example in generated IPython notebook)
 d = os.path.dirname(__file__) if "__file__" in locals() else os.getcwd()
@@ -39,7 +28,8 @@ text_path = os.path.join(d, "wc_cn/CalltoArms.txt")
 stopwords_path = os.path.join(d, "wc_cn/stopwords_cn_en.txt")
 userdict_list = ['阿Ｑ', '孔乙己', '单四嫂子']
 text = open(text_path, encoding="utf-8").read()
-processed_text = jieba_processing_txt(text, stopwords_path=stopwords_path, userdict_list=userdict_list)
+for word in userdict_list:
+    jieba.add_word(word)
 
 # load image. This has been modified in gimp to be brighter and have more saturation.
 # parrot_color = np.array(Image.open(os.path.join(d, "parrot-by-jose-mari-gimenez2.jpg")))
@@ -61,6 +51,9 @@ parrot_mask[edges > .08] = 255
 # relative_scaling=0 means the frequencies in the data are reflected less
 # acurately but it makes a better picture
 wc = WordCloud(
+    tokenizer=jieba.lcut,     # 用 jieba 分词
+    stopwords=load_stopwords(stopwords_path),
+    min_word_length=2,
     max_words=3000,           # 增加最大词数
     mask=parrot_mask, 
     max_font_size=25,         # 减小最大字体大小
@@ -74,7 +67,7 @@ wc = WordCloud(
 )
 
 # generate word cloud
-wc.generate(processed_text)
+wc.generate(text)
 plt.imshow(wc)
 
 # create coloring from image
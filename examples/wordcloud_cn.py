@@ -21,7 +21,7 @@ import matplotlib.pyplot as plt
 import os
 # jieba.load_userdict("txt\userdict.txt")
 # add userdict by load_userdict()
-from wordcloud import WordCloud, ImageColorGenerator
+from wordcloud import WordCloud, ImageColorGenerator, STOPWORDS
 
 # get data directory (using getcwd() is needed to support running example in generated IPython notebook)
 d = path.dirname(__file__) if "__file__" in locals() else os.getcwd()
@@ -40,24 +40,18 @@ text_path = os.path.join(d, "wc_cn/CalltoArms.txt")
 userdict_list = ['阿Ｑ', '孔乙己', '单四嫂子']
 text = open(text_path, encoding="utf-8").read()
 
-def jieba_processing_txt(text, stopwords_path=None, userdict_list=None):
-    if userdict_list:
-        for word in userdict_list:
-            jieba.add_word(word)
+for word in userdict_list:
+    jieba.add_word(word)
 
-    seg_list = jieba.cut(text, cut_all=False)
-    words = [w.strip() for w in seg_list if len(w.strip()) > 1]
-
-    if stopwords_path:
-        with open(stopwords_path, encoding='utf-8') as f:
-            stopwords = set(f.read().splitlines())
-        words = [w for w in words if w not in stopwords]
-
-    return ' '.join(words)
-
-processed_text = jieba_processing_txt(text, stopwords_path=stopwords_path, userdict_list=userdict_list)
+with open(stopwords_path, encoding='utf-8') as f:
+    stopwords = STOPWORDS | set(f.read().splitlines())
 
+# the text is segmented by jieba, without joining the words with spaces and
+# splitting them again; words of a single character are dropped
 wc = WordCloud(
+    tokenizer=jieba.lcut,
+    stopwords=stopwords,
+    min_word_length=2,
     font_path=font_path,
     max_words=5000,
     mask=back_coloring,
@@ -70,7 +64,7 @@ wc = WordCloud(
     random_state=42,
     background_color="white"
 )
-wc.generate(processed_text)
+wc.generate(text)
 
 if __name__ == '__main__':
     image_colors_default = ImageColorGenerator(back_coloring)
@@ -1,11 +1,18 @@
-from wordcloud import WordCloud, get_single_color_func, ImageColorGenerator
+from wordcloud import (WordCloud, get_single_color_func, ImageColorGenerator,
+                       HeavyHitters, TextPipeline, WindowedCounts,
+                       WordCounts, random_color_func)
+from wordcloud.wordcloud import colormap_color_func
+from wordcloud.tokenization import iter_shards, score, scores, tokenize_chunks
 
 import numpy as np
 import pytest
 
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from random import Random
 from numpy.testing import assert_array_equal
-from PIL import Image
+from PIL import Image, ImageColor
 import xml.etree.ElementTree as ET
 
 import matplotlib
@@ -206,6 +213,43 @@ def test_svg_syntax():
     ET.fromstring(svg)
 
 
+def test_svg_to_stream():
+    import io
+    wc = WordCloud(max_words=50, repeat=True, random_state=0)
+    wc.generate(THIS)
+    stream = io.StringIO()
+    assert wc.to_svg(file=stream, embed_image=True) is None
+    assert stream.getvalue() == wc.to_svg(embed_image=True)
+    ET.fromstring(stream.getvalue())
+
+
+def test_svg_embedded_font_is_cached(tmpdir):
+    pytest.importorskip("fontTools")
+    import base64
+    from fontTools.ttLib import TTFont
+    from wordcloud.wordcloud import FONT_PATH, _subset_cache
+
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    svg = wc.to_svg(embed_font=True)
+    ET.fromstring(svg)
+    assert 'format("woff")' in svg
+    n_cached = len(_subset_cache)
+    # same font and characters, the subset is reused
+    wc2 = WordCloud(max_words=50, random_state=1).generate(THIS)
+    assert wc2.to_svg(embed_font=True).count(list(_subset_cache.values())[-1]) == 1
+    assert len(_subset_cache) == n_cached
+
+    # pre-built full font
+    woff_path = str(tmpdir.join("font.woff"))
+    font = TTFont(FONT_PATH)
+    font.flavor = "woff"
+    font.save(woff_path)
+    with open(woff_path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+    svg = wc.to_svg(embed_font=woff_path)
+    assert data in svg
+
+
 def test_recolor():
     wc = WordCloud(max_words=50, colormap="jet")
     wc.generate(THIS)
@@ -224,6 +268,135 @@ def test_recolor():
     assert_array_equal(wc_again, wc.recolor(random_state=10))
 
 
+def test_rendered_image_is_cached():
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    array = wc._get_rendered()[1]
+    assert wc._get_rendered()[1] is array
+    assert not array.flags.writeable
+    # arrays and images handed out are copies
+    assert_array_equal(wc.to_array(), array)
+    wc.to_array()[:] = 0
+    np.array(wc)[:] = 0
+    img = wc.to_image()
+    img.paste((255, 0, 0), (0, 0, 100, 100))
+    assert wc._get_rendered()[1] is array
+    assert array.any()
+    assert np.asarray(wc, copy=False) is array
+
+    wc.recolor(random_state=1)
+    recolored = wc._get_rendered()[1]
+    assert recolored is not array
+    wc.background_color = "white"
+    assert_array_equal(wc.to_array()[0, 0], [255, 255, 255])
+    wc.generate("some other text")
+    assert wc._get_rendered()[1] is not recolored
+
+    # size changes and changes of layout_ in place
+    wc.width = 600
+    assert wc.to_array().shape == (200, 600, 3)
+    array = wc._get_rendered()[1]
+    wc.layout_.pop()
+    assert wc._get_rendered()[1] is not array
+
+    # changes of the mask in place
+    mask = np.zeros((100, 200), dtype=np.uint8)
+    wc = WordCloud(mask=mask, contour_width=2, max_words=50,
+                   random_state=0).generate(THIS)
+    array = wc.to_array()
+    mask[:, 100:] = 255
+    assert (wc.to_array() != array).any()
+
+
+@pytest.mark.parametrize("color_func", [
+    colormap_color_func("viridis"), colormap_color_func("tab10"),
+    get_single_color_func("deepskyblue"), get_single_color_func("gray"),
+    random_color_func,
+    ImageColorGenerator(np.random.RandomState(0).randint(0, 256, (200, 400, 3)).astype(np.uint8)),
+])
+def test_recolor_batch_matches_color_func(color_func):
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    wc.recolor(color_func=color_func, random_state=3)
+    assert all(isinstance(color, int) for _, _, _, _, color in wc.layout_)
+    batch_array = wc.to_array()
+    ET.fromstring(wc.to_svg())
+
+    # the same colors, one word at a time
+    random_state = Random(3)
+    glyphs = wc._get_glyphs()
+    wc.layout_ = [(word_freq, font_size, position, orientation,
+                   color_func(word=word_freq[0], font_size=font_size,
+                              position=position, orientation=orientation,
+                              random_state=random_state, font_path=wc.font_path,
+                              **wc._box_kwargs(color_func, glyphs, word_freq[0], font_size, orientation)))
+                  for word_freq, font_size, position, orientation, _ in wc.layout_]
+    assert_array_equal(wc.to_array(), batch_array)
+
+
+def test_word_cloud_old_pickle():
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    # state of a word cloud pickled by an older version, without the caches
+    # and settings added since and with colors as strings
+    state = wc.__getstate__()
+    for name in ('max_coverage', 'tokenizer', '_canvas', '_glyphs',
+                 '_rendered', '_contour', '_pipeline'):
+        del state[name]
+    state['layout_'] = [item[:-1] + (wc._css_color(item[-1]),)
+                        for item in wc.layout_]
+    old = WordCloud.__new__(WordCloud)
+    old.__setstate__(state)
+    assert old.layout_ == wc.layout_
+    assert_array_equal(old.to_array(), wc.to_array())
+    assert old.to_svg() == wc.to_svg()
+    assert old.process_text(THIS) == wc.process_text(THIS)
+    old.recolor(random_state=1)
+    assert_array_equal(old.to_array(), wc.recolor(random_state=1).to_array())
+
+
+def test_colormap_color_func_old_pickle():
+    color_func = colormap_color_func("viridis")
+    # unpickled from the state of older versions, without lookup table
+    old = colormap_color_func.__new__(colormap_color_func)
+    old.__setstate__({'colormap': color_func.colormap})
+    assert_array_equal(old.lut, color_func.lut)
+    assert old("word", 10, (0, 0), None, random_state=Random(1)) == \
+        color_func("word", 10, (0, 0), None, random_state=Random(1))
+
+
+def test_recolor_batch_gray_scale():
+    wc = WordCloud(max_words=50, random_state=0, mode="L").generate(THIS)
+    wc.recolor(color_func=get_single_color_func("gray"), random_state=3)
+    colors = [color for _, _, _, _, color in wc.layout_]
+    assert all(0 <= color <= 255 for color in colors)
+    # with equal channels, the luminance is the channel value
+    img = wc.to_image()
+    assert img.mode == "L"
+    assert set(np.unique(np.array(img))) >= {max(colors)}
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("RGB", 0xff0a1ec8), ("RGBA", 0x800a1ec8), ("L", 79)])
+def test_layout_colors_are_parsed(mode, expected):
+    color = "#c81e0a80" if mode == "RGBA" else "rgb(200, 30, 10)"
+    wc = WordCloud(max_words=20, random_state=0, mode=mode,
+                   background_color=None if mode == "RGBA" else "black",
+                   color_func=lambda *args, **kwargs: color)
+    wc.generate(THIS)
+    assert {layout[4] for layout in wc.layout_} == {expected}
+    # drawing the parsed colors gives the same image as drawing the strings
+    wc2 = WordCloud(mode=mode, background_color=wc.background_color)
+    wc2.layout_ = [layout[:4] + (color,) for layout in wc.layout_]
+    assert_array_equal(wc, wc2)
+    # tuples are parsed too
+    channels = 4 if mode == "RGBA" else 3
+    wc.recolor(color_func=lambda *args, **kwargs: (200, 30, 10, 128)[:channels])
+    assert {layout[4] for layout in wc.layout_} == {expected}
+
+    svg = wc.to_svg()
+    fill = {"RGB": "rgb(200, 30, 10)", "RGBA": "rgba(200, 30, 10, 0.502)",
+            "L": "rgb(79, 79, 79)"}[mode]
+    assert 'style="fill:%s"' % fill in svg
+
+
 def test_random_state():
     # check that random state makes everything deterministic
     wc = WordCloud(random_state=0)
@@ -287,6 +460,31 @@ def test_mask_contour():
     assert all(sm_array[100, 300] == [0, 0, 255])
 
 
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_mask_contour_is_cached(mode):
+    mask = np.zeros((234, 456), dtype=np.uint8)
+    mask[100:150, 300:400] = 255
+    wc = WordCloud(mask=mask, max_words=50, random_state=0, contour_width=3,
+                   contour_color="red", mode=mode,
+                   background_color=None if mode == "RGBA" else "black")
+    wc.generate(THIS)
+    region = (0, 0, 234, 456)
+    contour = wc._get_contour(region)
+    assert wc._get_contour(region) is contour
+    # the contour pixels have the contour color
+    red = ImageColor.getcolor("red", mode)
+    pixels = wc.to_array().reshape((-1,) + wc.to_array().shape[2:])
+    assert_array_equal(pixels[contour], np.broadcast_to(red, pixels[contour].shape))
+    assert_array_equal(wc.to_array()[100, 300], red)
+
+    # recoloring reuses the contour, changing its width doesn't
+    wc.recolor(random_state=1)
+    wc.to_array()
+    assert wc._get_contour(region) is contour
+    wc.contour_width = 10
+    assert len(wc._get_contour(region)) > len(contour)
+
+
 def test_single_color_func():
     # test single color function for different color formats
     random = Random(42)
@@ -347,6 +545,292 @@ def test_process_text_regexp_parameter():
     assert 'than' not in words
 
 
+@pytest.mark.parametrize("collocations", [True, False])
+def test_process_text_chunks(collocations):
+    import io
+    wc = WordCloud(collocations=collocations, collocation_threshold=3)
+    expected = list(wc.process_text(THIS).items())
+    # chunks cutting words and bigrams in pieces
+    chunks = [THIS[i:i + 7] for i in range(0, len(THIS), 7)]
+    assert list(wc.process_text(chunks).items()) == expected
+    assert list(wc.process_text(iter(chunks)).items()) == expected
+    assert list(wc.process_text(io.StringIO(THIS)).items()) == expected
+    assert list(wc.process_text(io.BytesIO(THIS.encode())).items()) == expected
+
+
+@pytest.mark.parametrize("collocations", [True, False])
+def test_word_counts_merge(collocations):
+    import json
+    import pickle
+    wc = WordCloud(collocations=collocations, collocation_threshold=3)
+    expected = list(wc.process_text(THIS).items())
+    # count parts of the text separately, cutting at whitespace
+    cuts = [0] + [THIS.index(" ", i) for i in (100, 101, 400, 800)] + [None]
+    parts = [wc.count_words(THIS[start:end])
+             for start, end in zip(cuts[:-1], cuts[1:])]
+    # serialized and merged in order
+    parts = [WordCounts.from_dict(json.loads(json.dumps(part.to_dict())))
+             for part in parts[:3]] + [pickle.loads(pickle.dumps(part))
+                                       for part in parts[3:]]
+    counts = WordCounts(collocations=collocations)
+    for part in parts:
+        counts.merge(part).merge(WordCounts(collocations=collocations))
+    single = wc.count_words(THIS)
+    assert counts.unigrams == single.unigrams
+    assert counts.bigrams == single.bigrams
+    assert list(wc.process_text(counts).items()) == expected
+    # counts can be continued
+    assert list(wc.process_text(
+        wc.count_words(THIS[cuts[2]:], wc.count_words(THIS[:cuts[2]]))
+    ).items()) == expected
+
+    with pytest.raises(ValueError, match="collocations"):
+        counts.merge(WordCounts(collocations=not collocations))
+
+
+def test_word_counts_add():
+    counts = WordCounts()
+    counts.add(["The", "white", "Rabbit", "the", "white", "rabbit"], {"the"})
+    assert counts.unigrams == {"white": 2, "Rabbit": 1, "rabbit": 1}
+    assert counts.bigrams == {("white", "Rabbit"): 1, ("white", "rabbit"): 1}
+    assert (counts.first, counts.last) == (None, "rabbit")
+    # words are looked up again if the stopwords change
+    counts.add(["the", "rabbit"], {"rabbit"})
+    assert counts.unigrams == {"white": 2, "Rabbit": 1, "rabbit": 1,
+                               "the": 1}
+    assert counts.bigrams == {("white", "Rabbit"): 1, ("white", "rabbit"): 1,
+                              ("rabbit", "the"): 1}
+    assert (counts.n_words, counts.n_tokens) == (5, 8)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_count_words_n_jobs(n_jobs):
+    from wordcloud.parallel import count_words
+    wc = WordCloud(collocation_threshold=3)
+    expected = list(wc.process_text(THIS).items())
+    assert list(wc.process_text(THIS, n_jobs=n_jobs).items()) == expected
+    # many small parts
+    counts = count_words(wc, THIS, n_jobs=n_jobs, shard_size=50)
+    assert list(wc.process_text(counts).items()) == expected
+
+
+class BatchTokenizer(object):
+    """Tokenizer of texts in batches, counting the batches."""
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, text):
+        return re.findall(r"\w[\w']*|\s+|[^\w\s]", text)
+
+    def batch(self, texts):
+        self.batches.append(len(texts))
+        return [self(text) for text in texts]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_tokenizer(n_jobs):
+    from wordcloud.parallel import count_words
+    expected = list(WordCloud(collocation_threshold=3).process_text(THIS)
+                    .items())
+    # whitespace and punctuation tokens are dropped
+    tokenizer = BatchTokenizer()
+    wc = WordCloud(collocation_threshold=3, tokenizer=tokenizer)
+    assert list(wc.process_text(THIS).items()) == expected
+    counts = count_words(wc, THIS, n_jobs=n_jobs, shard_size=50)
+    assert list(wc.process_text(counts).items()) == expected
+    # long texts are segmented in batches of parts
+    tokenizer.batches = []
+    pipeline = wc.text_pipeline()
+    pipeline.shard_size = 50
+    assert list(pipeline.process(THIS).items()) == expected
+    assert len(tokenizer.batches) > 1
+    assert max(tokenizer.batches) == pipeline.batch_size
+
+    wc = WordCloud(tokenizer=list, collocations=False)
+    assert wc.process_text(u"天下大势，分久必合，合久必分。") == {
+        u"天": 1, u"下": 1, u"大": 1, u"势": 1, u"分": 2, u"久": 2, u"必": 2,
+        u"合": 2}
+
+
+def test_iter_shards():
+    shards = list(iter_shards(["Beautiful is better", " than ugly.\n"], 8))
+    assert "".join(shards) == "Beautiful is better than ugly.\n"
+    assert shards == ["Beautiful ", "is ", "better ", "than ", "ugly.\n"]
+
+
+def test_iter_shards_without_whitespace():
+    # ideographic spaces separate the shards of CJK text
+    shards = list(iter_shards(u"天下大势\u3000分久必合\u3000合久必分", 6))
+    assert shards == [u"天下大势\u3000", u"分久必合\u3000", u"合久必分"]
+    # text without any whitespace isn't kept in memory as a whole
+    text = "x" * 1000
+    shards = list(iter_shards([text[i:i + 10] for i in range(0, 1000, 10)],
+                              10))
+    assert "".join(shards) == text
+    assert max(len(shard) for shard in shards) <= 50
+
+
+def test_collocation_scores():
+    rng = np.random.RandomState(0)
+    n_words = 10000
+    counts1 = rng.randint(1, n_words + 1, size=1000)
+    counts2 = rng.randint(1, n_words + 1, size=1000)
+    count_bigrams = np.minimum(rng.randint(1, 100, size=1000),
+                               np.minimum(counts1, counts2))
+    expected = [score(c12, c1, c2, n_words) for c12, c1, c2
+                in zip(count_bigrams.tolist(), counts1.tolist(),
+                       counts2.tolist())]
+    np.testing.assert_allclose(
+        scores(count_bigrams, counts1, counts2, n_words), expected,
+        rtol=1e-9, atol=1e-9)
+
+
+def test_tokenize_chunks():
+    chunks = ["Beautiful is bet", "te", "r than ug", "ly.\nExplicit", " is"]
+    tokens = list(tokenize_chunks(chunks, r"\w+"))
+    assert sum(tokens, []) == ["Beautiful", "is", "better", "than", "ugly",
+                               "Explicit", "is"]
+    # a chunk without whitespace is carried over to the next one
+    assert tokens[1] == []
+
+
+def test_tokenize_chunks_without_whitespace():
+    chunks = [u"天下大势\u3000分", u"久必合\u3000合久必分"]
+    tokens = list(tokenize_chunks(chunks, r"\w+"))
+    assert tokens == [[u"天下大势"], [u"分久必合", u"合久必分"]]
+    # minified data is cut after a few chunks without whitespace
+    tokens = list(tokenize_chunks(["abcd"] * 100, r"\w+"))
+    assert "".join(sum(tokens, [])) == "abcd" * 100
+    assert max(len(token) for token in sum(tokens, [])) <= 20
+
+
+def test_text_pipeline():
+    wc = WordCloud(stopwords=["Beautiful"])
+    pipeline = wc.text_pipeline()
+    assert isinstance(pipeline, TextPipeline)
+    # the pipeline is reused until a setting changes
+    assert wc.text_pipeline() is pipeline
+    assert "beautiful" in pipeline.stopwords
+    texts = [THIS[i:] for i in range(0, len(THIS), 97)]
+    expected = [wc.process_text(text) for text in texts]
+    with ThreadPoolExecutor(4) as executor:
+        result = list(executor.map(pipeline.process, texts * 2))
+    assert result == expected * 2
+    assert list(pipeline.process(THIS).items()) == \
+        list(wc.process_text(THIS).items())
+
+    wc.min_word_length = 5
+    assert wc.text_pipeline() is not pipeline
+    assert all(len(word) >= 5 for word in wc.process_text(THIS))
+    pipeline = wc.text_pipeline()
+    wc.stopwords.append("Better")
+    assert "better" not in wc.process_text(THIS)
+    assert wc.text_pipeline() is not pipeline
+
+
+def test_heavy_hitters_exact():
+    # counts are exact when the vocabulary fits
+    wc = WordCloud()
+    counts = wc.count_words(THIS, counts=HeavyHitters(capacity=1000))
+    assert counts.error == 0
+    assert list(wc.process_text(counts).items()) == \
+        list(wc.process_text(THIS).items())
+    # merged with exact or approximate counts
+    i, j = THIS.index(" ", 400), THIS.index(" ", 800)
+    counts = wc.count_words(THIS[:i], counts=HeavyHitters(capacity=1000))
+    counts.merge(wc.count_words(THIS[i:j]))
+    counts.merge(wc.count_words(THIS[j:], counts=HeavyHitters(1000)))
+    assert counts.n_tokens == wc.count_words(THIS).n_tokens
+    assert wc.process_text(counts) == wc.process_text(THIS)
+    with pytest.raises(ValueError, match="collocations"):
+        counts.merge(HeavyHitters(collocations=False).add(["word"]))
+
+
+def test_heavy_hitters_n_jobs():
+    from wordcloud.parallel import count_words
+    words = ["w%d" % i for i in Random(42).choices(
+        range(2000), weights=[1 / (i + 1) for i in range(2000)], k=20000)]
+    text = " ".join(words)
+    wc = WordCloud(collocations=False, stopwords=[])
+    counts = HeavyHitters(capacity=100, collocations=False)
+    # parts are merged into the heavy hitters as they are counted
+    assert count_words(wc, text, counts, n_jobs=2, shard_size=5000) is counts
+    assert len(counts.unigrams) <= 2 * counts.capacity
+    assert counts.n_words == len(words)
+    counts = wc.count_words(text, HeavyHitters(100, collocations=False),
+                            n_jobs=2)
+    assert len(counts.unigrams) <= 2 * counts.capacity
+
+
+def test_heavy_hitters_bounds():
+    words = ["w%d" % i for i in Random(42).choices(
+        range(2000), weights=[1 / (i + 1) for i in range(2000)], k=20000)]
+    true = Counter(words)
+    counts = HeavyHitters(capacity=100, collocations=False)
+    for i in range(0, len(words), 500):
+        counts.add(words[i:i + 500])
+    unigrams = counts.unigrams
+    assert len(unigrams) <= 200
+    assert 0 < counts.error <= counts.n_words / 100
+    for word, count in true.items():
+        if count > counts.n_words / 100:
+            assert word in unigrams
+    for word, count in unigrams.items():
+        assert 0 <= count - true[word] <= counts.error
+    # words that can't be among the most frequent are dropped
+    frequencies = counts.frequencies(max_words=10)
+    assert 10 <= len(frequencies) < len(unigrams)
+    for word, _ in true.most_common(10):
+        assert word in frequencies
+
+
+def test_windowed_counts():
+    wc = WordCloud()
+    parts = ["%s part%d" % (THIS, i) for i in range(5)] + ["Zebra zebras"]
+    counts = WindowedCounts(n_buckets=2)
+    for part in parts:
+        counts.rotate()
+        wc.count_words(part, counts=counts)
+    assert counts.unigrams["Zebra"] == 1
+    assert "part4" in counts.unigrams and "part3" not in counts.unigrams
+    # same as counting the buckets of the window from scratch
+    expected = WindowedCounts()
+    wc.count_words(parts[-2], counts=expected)
+    expected.rotate()
+    wc.count_words(parts[-1], counts=expected)
+    assert list(wc.process_text(counts).items()) == \
+        list(wc.process_text(expected).items())
+    assert wc.process_text(counts)["Zebra"] == 2
+    # expired buckets leave nothing behind
+    counts.rotate().rotate()
+    assert counts.unigrams == {} and counts.bigrams == {}
+    assert counts.n_words == 0
+    # buckets of windowed counts can't be aligned
+    for other in [WordCounts(), HeavyHitters(), counts]:
+        with pytest.raises(TypeError, match="WindowedCounts"):
+            other.merge(expected)
+    with pytest.raises(TypeError, match="HeavyHitters"):
+        WordCounts().merge(HeavyHitters())
+
+
+def test_windowed_counts_decay():
+    wc = WordCloud()
+    counts = WindowedCounts(n_buckets=3, decay=0.5)
+    # the weights are rescaled now and then
+    counts._max_weight = 10
+    for i in range(10):
+        counts.rotate()
+        wc.count_words("better " * (i + 1), counts=counts)
+    assert counts._base > 0
+    assert counts.unigrams["better"] == pytest.approx(10 + 9 / 2 + 8 / 4)
+    assert counts.n_words == pytest.approx(10 + 9 / 2 + 8 / 4)
+    with pytest.raises(ValueError, match="decay"):
+        WindowedCounts(decay=0)
+    with pytest.raises(ValueError, match="n_buckets"):
+        WindowedCounts(n_buckets=0)
+
+
 def test_generate_from_frequencies():
     # test that generate_from_frequencies() takes input argument dicts
     wc = WordCloud(max_words=50)
@@ -407,6 +891,41 @@ def test_recolor_too_small_set_default():
     wc.recolor(color_func=image_colors)
 
 
+@pytest.mark.parametrize("channels", [None, 3, 4])
+def test_image_color_generator_region_means(channels):
+    rng = np.random.RandomState(0)
+    shape = (200, 400) if channels is None else (200, 400, channels)
+    colouring = rng.randint(0, 256, size=shape).astype(np.uint8)
+    image_colors = ImageColorGenerator(colouring)
+    wc = WordCloud(max_words=50, random_state=0, color_func=image_colors)
+    wc.generate(THIS)
+
+    glyphs = wc._get_glyphs()
+    for (word, _), font_size, (x, y), orientation, color in wc.layout_:
+        box = glyphs.box(word, font_size, orientation)
+        patch = colouring[x:x + box[3], y:y + box[2]]
+        if channels is None:
+            patch = np.dstack([patch] * 3)
+        expected = patch[:, :, :3].reshape(-1, 3).mean(axis=0)
+        assert wc._css_color(color) == "rgb(%d, %d, %d)" % tuple(expected)
+    # measuring the word gives the same box
+    (word, _), font_size, position, orientation, color = wc.layout_[0]
+    assert image_colors(word, font_size, wc.font_path, position,
+                        orientation) == wc._css_color(color)
+
+
+def test_image_color_generator_old_pickle():
+    colouring = np.random.RandomState(0).randint(0, 256, (20, 30, 3))
+    image_colors = ImageColorGenerator(colouring.astype(np.uint8))
+    # unpickled from the state of older versions
+    old = ImageColorGenerator.__new__(ImageColorGenerator)
+    old.__setstate__({'image': image_colors.image, 'default_color': None})
+    assert old.image is image_colors.image
+    box = (0, 0, 5, 4)
+    assert old("word", 10, None, (2, 3), None, box_size=box) == \
+        image_colors("word", 10, None, (2, 3), None, box_size=box)
+
+
 def test_small_canvas():
     # check font size fallback works on small canvas
     wc = WordCloud(max_words=50, width=21, height=21)
@@ -502,3 +1021,302 @@ def test_max_font_size_as_mask_height():
 
     # Check if the biggest element has the same font size
     assert wc.layout_[0][1] == wc2.layout_[0][1]
+
+
+def test_repeat_max_coverage():
+    text = "Some short text"
+    wc = WordCloud(max_words=500, stopwords=[], repeat=True, random_state=0)
+    wc.generate(text)
+    wc_covered = WordCloud(max_words=500, stopwords=[], repeat=True,
+                           random_state=0, max_coverage=.3)
+    wc_covered.generate(text)
+    assert 3 <= len(wc_covered.layout_) < len(wc.layout_)
+    # the fill stops as soon as the target is reached
+    coverage = (wc_covered.to_array().sum(axis=-1) != 0).mean()
+    assert .3 <= coverage < .4
+
+    # the coverage target, not max_words, stops the repetitions
+    wc_full = WordCloud(max_words=50, stopwords=[], repeat=True,
+                        random_state=0, max_coverage=1)
+    wc_full.generate(text)
+    assert len(wc_full.layout_) > 50
+
+    with pytest.raises(ValueError, match="max_coverage"):
+        WordCloud(max_coverage=0)
+
+
+def test_glyph_cache_paste_matches_draw():
+    from PIL import ImageDraw
+    from wordcloud.wordcloud import GlyphCache, FONT_PATH
+
+    glyphs = GlyphCache(FONT_PATH)
+    for orientation in [None, Image.ROTATE_90]:
+        img = Image.new("L", (120, 80))
+        ImageDraw.Draw(img).text((90, 10), "Quirky", fill="white",
+                                 font=glyphs.font(23, orientation))
+        img_array = np.zeros((80, 120), dtype=np.uint8)
+        covered = glyphs.paste(img_array, "Quirky", 23, orientation, (10, 90))
+        assert_array_equal(img_array, np.asarray(img))
+        assert covered == np.count_nonzero(img_array)
+
+
+def test_glyph_cache_is_bounded():
+    from wordcloud.wordcloud import GlyphCache, FONT_PATH
+
+    glyphs = GlyphCache(FONT_PATH, max_pixels=10000, max_entries=10)
+    for font_size in range(10, 40):
+        box = glyphs.box("Quirky", font_size)
+        glyphs.extent("Quirky", font_size)
+        glyphs.metrics("Quirky", font_size)
+        glyphs.sprite("Quirky", font_size)
+        assert glyphs.box("Quirky", font_size) is box
+    for cache in (glyphs._boxes, glyphs._extents, glyphs._metrics):
+        assert 0 < len(cache) <= 10
+    assert glyphs._n_pixels <= 10000
+
+
+def test_generate_from_frequency_arrays():
+    wc = WordCloud(max_words=50, random_state=0)
+    frequencies = wc.process_text(THIS)
+    wc.generate_from_frequencies(frequencies)
+
+    words = np.array(list(frequencies.keys()))
+    weights = np.array(list(frequencies.values()))
+    wc_arrays = WordCloud(max_words=50, random_state=0)
+    wc_arrays.generate_from_frequencies((words, weights))
+    assert wc_arrays.words_ == wc.words_
+    assert wc_arrays.layout_ == wc.layout_
+
+    pd = pytest.importorskip("pandas")
+    wc_series = WordCloud(max_words=50, random_state=0)
+    wc_series.generate_from_frequencies(pd.Series(weights, index=words))
+    assert wc_series.layout_ == wc.layout_
+
+
+def test_top_frequencies_ties():
+    from wordcloud.wordcloud import top_frequencies
+
+    words = ["a", "b", "c", "d", "e"]
+    weights = [1, 3, 2, 3, 2]
+    expected = [("b", 3), ("d", 3), ("c", 2)]
+    assert top_frequencies((words, weights), 3) == expected
+    assert top_frequencies(dict(zip(words, weights)), 3) == expected
+
+    with pytest.raises(ValueError, match="5 words but 4 frequencies"):
+        top_frequencies((words, weights[:4]), 3)
+    assert top_frequencies((words, weights), 0) == []
+    assert top_frequencies(dict(zip(words, weights)), 0) == []
+    with pytest.raises(ValueError, match="finite, got nan"):
+        top_frequencies((["a", "b"], [1, np.nan]), 1)
+
+
+@pytest.mark.filterwarnings("ignore::PendingDeprecationWarning")
+def test_generate_per_group():
+    sparse = pytest.importorskip("scipy.sparse")
+    vocabulary = np.array(["better", "than", "idea", "never", "simple"])
+    X = sparse.csr_matrix(np.array([[3, 1, 0, 0, 0],
+                                    [0, 2, 0, 4, 1],
+                                    [1, 0, 4, 0, 0],
+                                    [0, 0, 1, 4, 0]]))
+    groups = ["b", "a", "b", "a"]
+    wc = WordCloud(random_state=0)
+    clouds = {group: (wc.words_, len(wc.layout_))
+              for group, wc in wc.generate_per_group(X, vocabulary, groups)}
+    assert list(clouds) == ["a", "b"]
+    assert clouds["a"] == ({"never": 1, "than": .25, "idea": .125,
+                            "simple": .125}, 4)
+    assert clouds["b"] == ({"better": 1, "idea": 1, "than": .25}, 3)
+
+    # dense input and a single group
+    (group, wc), = wc.generate_per_group(X.toarray(), vocabulary)
+    assert wc.words_ == {"never": 1, "idea": .625, "better": .5,
+                         "than": .375, "simple": .125}
+
+    with pytest.raises(ValueError, match="3 group labels"):
+        next(wc.generate_per_group(X, vocabulary, groups[:3]))
+
+    # dense np.matrix input
+    (group, wc), = wc.generate_per_group(np.asmatrix(X.toarray()), vocabulary)
+    assert wc.words_ == {"never": 1, "idea": .625, "better": .5,
+                         "than": .375, "simple": .125}
+
+    # empty groups don't stop the others
+    X = sparse.csr_matrix(np.array([[0, 0, 0, 0, 0],
+                                    [0, 2, 0, 4, 1],
+                                    [0, 0, 0, 0, 0]]))
+    for dense in [False, True]:
+        clouds = {group: cloud and cloud.words_ for group, cloud in
+                  wc.generate_per_group(X.toarray() if dense else X,
+                                        vocabulary, ["a", "b", "c"])}
+        assert clouds == {"a": None, "b": {"never": 1, "than": .5,
+                                           "simple": .25}, "c": None}
+
+
+def test_generate_many(tmpdir):
+    pytest.importorskip("multiprocessing.shared_memory")
+    from wordcloud import generate_many
+
+    mask = np.zeros((234, 456), dtype=np.uint8)
+    mask[100:150, 300:400] = 255
+    wc = WordCloud(mask=mask, max_words=50, random_state=0)
+    filename = str(tmpdir.join("word_cloud.png"))
+    jobs = [(THIS, None), ("", None), ({"one": 2, "two": 1}, filename)]
+    results = {index: (result, error) for index, result, error
+               in generate_many(wc, jobs, n_jobs=2)}
+
+    layout, error = results[0]
+    assert error is None
+    assert len(layout) == 50
+    # a failing job doesn't stop the others
+    assert results[1][0] is None
+    assert isinstance(results[1][1], ValueError)
+    assert results[2] == (filename, None)
+    assert Image.open(filename).size == (456, 234)
+    # the template word cloud isn't changed
+    assert not hasattr(wc, "layout_")
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_render_tiled(n_jobs, tmpdir):
+    from wordcloud import render_tiled
+
+    mask = np.zeros((234, 456), dtype=np.uint8)
+    mask[100:150, 300:400] = 255
+    wc = WordCloud(mask=mask, max_words=50, random_state=0, scale=1.5)
+    wc.generate(THIS)
+    expected = wc.to_array()
+
+    img = render_tiled(wc, tile_size=(70, 100), n_jobs=n_jobs)
+    assert img.size == (684, 351)
+    assert_array_equal(np.array(img), expected)
+
+    out = np.lib.format.open_memmap(str(tmpdir.join("out.npy")), mode="w+",
+                                    dtype=np.uint8, shape=expected.shape)
+    assert render_tiled(wc, out=out, tile_size=128, n_jobs=n_jobs) is out
+    assert_array_equal(out, expected)
+
+    with pytest.raises(ValueError, match="shape"):
+        render_tiled(wc, out=np.zeros((10, 10, 3), dtype=np.uint8))
+
+
+def test_render_region_contour():
+    mask = np.zeros((234, 456), dtype=np.uint8)
+    mask[100:150, 300:400] = 255
+    wc = WordCloud(mask=mask, max_words=50, random_state=0, contour_width=3,
+                   contour_color="red")
+    expected = wc.generate(THIS).to_array()
+    tile = np.array(wc._render_region((80, 250, 180, 420)))
+    assert_array_equal(tile, expected[80:180, 250:420])
+
+
+@pytest.mark.parametrize("options, expected_format", [
+    ({}, "PNG"),
+    ({"compress_level": 1}, "PNG"),
+    ({"format": "jpeg", "quality": 50, "optimize": True}, "JPEG"),
+    ({"format": "webp", "optimize": False}, "WEBP"),
+    ({"format": "webp", "lossless": True}, "WEBP"),
+])
+def test_to_file_encoding_options(options, expected_format):
+    import io
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    buffer = io.BytesIO()
+    assert wc.to_file(buffer, **options) is wc
+    img = Image.open(io.BytesIO(buffer.getvalue()))
+    assert img.format == expected_format
+    if expected_format == "PNG" or options.get("lossless"):
+        assert_array_equal(np.array(img), wc.to_array())
+    assert wc.to_bytes(**options) == buffer.getvalue()
+
+
+def test_to_file_format_from_name(tmpdir):
+    wc = WordCloud(max_words=50, random_state=0).generate(THIS)
+    wc.to_file(str(tmpdir.join("word_cloud.jpg")), quality=30)
+    assert Image.open(str(tmpdir.join("word_cloud.jpg"))).format == "JPEG"
+    with open(str(tmpdir.join("word_cloud.webp")), "wb") as f:
+        wc.to_file(f)
+    assert Image.open(str(tmpdir.join("word_cloud.webp"))).format == "WEBP"
+    with pytest.raises(ValueError, match="extension"):
+        wc.to_file(str(tmpdir.join("word_cloud.unknown")))
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L"])
+def test_to_file_band_height(mode, tmpdir):
+    wc = WordCloud(mode=mode, max_words=50, random_state=0, scale=1.5,
+                   background_color=None if mode == "RGBA" else "black")
+    wc.generate(THIS)
+    if mode == "L":
+        wc.recolor(color_func=lambda *args, **kwargs: 200)
+    filename = str(tmpdir.join("word_cloud.png"))
+    wc.to_file(filename, band_height=37)
+
+    img = Image.open(filename)
+    assert img.mode == mode
+    assert_array_equal(np.array(img), wc.to_array())
+
+    with pytest.raises(ValueError, match="PNG"):
+        wc.to_file(str(tmpdir.join("word_cloud.jpg")), band_height=37)
+
+
+@pytest.mark.parametrize("use_path", [False, True])
+def test_share_array_pickles_by_reference(use_path, tmpdir):
+    import pickle
+    if not use_path:
+        pytest.importorskip("multiprocessing.shared_memory")
+    from wordcloud import share_array
+
+    path = str(tmpdir.join("image.npy")) if use_path else None
+    image = np.zeros((300, 400, 3), dtype=np.uint8)
+    image[:, 200:] = 255
+    shared = share_array(image, path=path)
+    wc = WordCloud(mask=shared, color_func=ImageColorGenerator(shared))
+    pickled = pickle.dumps(wc)
+    assert len(pickled) < image.nbytes / 10
+
+    wc_loaded = pickle.loads(pickled)
+    assert_array_equal(wc_loaded.mask, image)
+    assert not wc_loaded.mask.flags.writeable
+    # the same memory is mapped
+    shared[0, 0] = 7
+    assert_array_equal(wc_loaded.color_func.image[0, 0], 7)
+
+    # derived arrays are pickled by value
+    assert_array_equal(pickle.loads(pickle.dumps(shared[:10])), shared[:10])
+
+
+def test_image_color_generator_shares_integral():
+    import pickle
+    pytest.importorskip("multiprocessing.shared_memory")
+    from wordcloud import share_array
+    from wordcloud.parallel import SharedArray
+
+    image = np.zeros((300, 400, 3), dtype=np.uint8)
+    image[:, 200:] = 255
+    generator = ImageColorGenerator(share_array(image))
+    pickled = pickle.dumps(generator)
+    assert len(pickled) < image.nbytes / 10
+    loaded = pickle.loads(pickled)
+    # the summed-area table is mapped, not computed again
+    integral = loaded._integral
+    assert isinstance(integral, SharedArray)
+    assert loaded._get_integral() is integral
+    assert_array_equal(integral, generator._get_integral())
+    assert loaded("word", 10, None, (0, 250), None, box_size=(0, 0, 20, 10)) \
+        == "rgb(255, 255, 255)"
+
+
+def test_to_image_matches_draw_text():
+    # blending the cached sprites gives the same pixels as drawing the text
+    from PIL import ImageDraw, ImageFont
+
+    wc = WordCloud(max_words=50, scale=1.5, prefer_horizontal=.5,
+                   random_state=0).generate(THIS)
+    img = Image.new("RGB", (int(wc.width * 1.5), int(wc.height * 1.5)),
+                    wc.background_color)
+    draw = ImageDraw.Draw(img)
+    for (word, _), font_size, position, orientation, color in wc.layout_:
+        font = ImageFont.TransposedFont(
+            ImageFont.truetype(wc.font_path, int(font_size * 1.5)),
+            orientation=orientation)
+        draw.text((int(position[1] * 1.5), int(position[0] * 1.5)), word,
+                  fill=color, font=font)
+    assert_array_equal(wc.to_array(), np.asarray(img))
@@ -7,6 +7,7 @@ import contextlib
 
 import wordcloud as wc
 from wordcloud import wordcloud_cli as cli
+from PIL import Image
 
 from unittest.mock import patch
 import pytest
@@ -127,12 +128,31 @@ def test_parse_args_defaults_to_random_color(tmp_text_file):
     assert args['color_func'] == wc.random_color_func
 
 
+def test_parse_args_defaults_to_one_job(tmp_text_file):
+    # parallelism is opt-in
+    args, text, image_file = cli.parse_args(['--text', str(tmp_text_file)])
+    assert args['n_jobs'] == 1
+
+
 def test_unicode_text_file():
     unicode_file = os.path.join(os.path.dirname(__file__), "unicode_text.txt")
     args, text, image_file = cli.parse_args(['--text', unicode_file])
     assert len(text) == 16
 
 
+def test_cli_streams_text_file(tmpdir, tmp_text_file):
+    tmp_text_file.write(b'some text')
+    tmp_image_file = tmpdir.join("word_cloud.png")
+
+    args, text, image_file = cli.parse_args(['--text', str(tmp_text_file), '--imagefile', str(tmp_image_file)],
+                                            stream_text=True)
+    # the file is read chunk by chunk by main
+    assert hasattr(text, 'read')
+    cli.main(args, text, image_file)
+    assert text.closed
+    assert tmp_image_file.size() > 0
+
+
 def test_unicode_with_stopwords():
     unicode_file = os.path.join(os.path.dirname(__file__), "unicode_text.txt")
     stopwords_file = os.path.join(os.path.dirname(__file__), "unicode_stopwords.txt")
@@ -170,6 +190,18 @@ def test_cli_writes_to_stdout(tmpdir, tmp_text_file):
     assert tmp_image_file.size() > 0
 
 
+def test_cli_image_format(tmpdir, tmp_text_file):
+    tmp_text_file.write(b'some text')
+    tmp_image_file = tmpdir.join("word_cloud.png")
+
+    args, text, image_file = cli.parse_args(['--text', str(tmp_text_file), '--imagefile', str(tmp_image_file),
+                                             '--format', 'webp', '--quality', '50', '--no_optimize'])
+    assert args['optimize'] is False
+    cli.main(args, text, image_file)
+
+    assert Image.open(str(tmp_image_file)).format == 'WEBP'
+
+
 def test_cli_regexp(tmp_text_file):
     cli.parse_args(['--regexp', r"\w[\w']+", '--text', str(tmp_text_file)])
 
@@ -203,3 +235,37 @@ def test_cli_as_executable(command, expected_output, expected_exit_code, tmpdir,
     assert expected_output in out if ret_code == 0 else err
 
     assert ret_code == expected_exit_code
+
+
+def test_cli_batch(tmpdir, capsys):
+    pytest.importorskip("multiprocessing.shared_memory")
+    tmpdir.join("first.txt").write("some text")
+    tmpdir.join("second.txt").write("some more text")
+    batch_file = tmpdir.join("batch.txt")
+    batch_file.write("\n".join([
+        str(tmpdir.join("first.txt")),
+        str(tmpdir.join("missing.txt")),
+        str(tmpdir.join("second.txt")) + "\t" + str(tmpdir.join("out.png")),
+    ]))
+
+    args, text, image_file = cli.parse_args(['--batch', str(batch_file), '--n_jobs', '2'])
+    assert text is None
+    assert cli.main(args, text, image_file) == 1
+
+    _, err = capsys.readouterr()
+    assert "missing.txt" in err
+    assert tmpdir.join("first.png").size() > 0
+    assert tmpdir.join("out.png").size() > 0
+
+
+def test_cli_batch_rejects_imagefile(tmpdir):
+    batch_file = tmpdir.join("batch.txt")
+    batch_file.write("first.txt")
+    image_file = tmpdir.join("word_cloud.png")
+
+    with pytest.raises(ValueError, match="batch file or an image file"):
+        cli.parse_args(['--batch', str(batch_file), '--imagefile', str(image_file)])
+    # the image file isn't created
+    assert not image_file.exists()
+    args, text, image_file = cli.parse_args(['--batch', str(batch_file)])
+    assert image_file is None
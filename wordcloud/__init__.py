@@ -1,9 +1,15 @@
 from .wordcloud import (WordCloud, STOPWORDS, random_color_func,
                         get_single_color_func)
 from .color_from_image import ImageColorGenerator
+from .tokenization import (HeavyHitters, TextPipeline, WindowedCounts,
+                           WordCounts)
+from .parallel import generate_many, render_tiled, share_array
+from .png import write_png
 
 __all__ = ['WordCloud', 'STOPWORDS', 'random_color_func',
            'get_single_color_func', 'ImageColorGenerator',
+           'generate_many', 'render_tiled', 'share_array', 'write_png',
+           'HeavyHitters', 'TextPipeline', 'WindowedCounts', 'WordCounts',
            '__version__']
 
 from ._version import __version__
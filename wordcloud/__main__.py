@@ -12,6 +12,8 @@ Usage:
 
     $ wordcloud_cli --text=words.txt --stopwords=stopwords.txt
 
+    $ wordcloud_cli --batch=jobs.txt --n_jobs=8
+
 * using ``wordcloud`` module::
 
     $ cat word.txt | python -m wordcloud
@@ -30,7 +32,11 @@ def main():
 
     This is installed as the script entry point.
     """
-    wordcloud_cli_main(*wordcloud_cli_parse_args(sys.argv[1:]))
+    # the text file is streamed instead of read at once
+    args = wordcloud_cli_parse_args(sys.argv[1:], stream_text=True)
+    if wordcloud_cli_main(*args):
+        # some jobs of a batch failed
+        sys.exit(1)
 
 
 if __name__ == '__main__':  # pragma: no cover
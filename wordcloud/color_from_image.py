@@ -15,7 +15,10 @@ class ImageColorGenerator(object):
     ----------
     image : nd-array, shape (height, width, 3)
         Image to use to generate word colors. Alpha channels are ignored.
+        Gray-scale images of shape (height, width) give gray colors.
         This should be the same size as the canvas. for the wordcloud.
+        Use :func:`share_array` to pickle the generator without copying the
+        image or its summed-area table.
     default_color : tuple or None, default=None
         Fallback colour to use if the canvas is larger than the image,
         in the format (r, g, b). If None, raise ValueError instead.
@@ -30,29 +33,135 @@ class ImageColorGenerator(object):
                              % image.shape[2])
         self.image = image
         self.default_color = default_color
+        # precompute the summed-area table
+        self._get_integral()
 
-    def __call__(self, word, font_size, font_path, position, orientation, **kwargs):
-        """Generate a color for a given word using a fixed image."""
-        # get the font to get the box size
-        font = ImageFont.truetype(font_path, font_size)
-        transposed_font = ImageFont.TransposedFont(font,
-                                                   orientation=orientation)
-        # get size of resulting text
-        box_size = transposed_font.getbbox(word)
-        x = position[0]
-        y = position[1]
-        # cut out patch under word box
-        patch = self.image[x:x + box_size[2], y:y + box_size[3]]
-        if patch.ndim == 3:
+    @property
+    def image(self):
+        return self._image
+
+    @image.setter
+    def image(self, image):
+        self._image = image
+        self._integral = None
+
+    def __getstate__(self):
+        # Import here, to avoid a circular import
+        from .parallel import SharedArray, share_array
+
+        state = self.__dict__.copy()
+        # the summed-area table is recomputed when needed, unless the image
+        # is shared: then the table is shared too, instead of being computed
+        # by every process the generator is sent to
+        state['_integral'] = None
+        if isinstance(self._image, SharedArray) and self._image._ref:
+            if not isinstance(self._integral, SharedArray):
+                try:
+                    self._integral = share_array(self._get_integral())
+                except ImportError:
+                    # no shared memory before Python 3.8
+                    return state
+            state['_integral'] = self._integral
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        if 'image' in state:
+            # pickled by an older version
+            state['_image'] = state.pop('image')
+        state.setdefault('_integral', None)
+        self.__dict__.update(state)
+
+    def _get_integral(self):
+        """Summed-area table of each channel, with a leading row and column
+        of zeros, so that the sum of any rectangle takes four lookups."""
+        if self._integral is None:
+            image = self._image
+            if image.ndim == 2:
+                image = image[:, :, np.newaxis]
             # drop alpha channel if any
-            patch = patch[:, :, :3]
-        if patch.ndim == 2:
-            raise NotImplementedError("Gray-scale images TODO")
+            image = image[:, :, :3]
+            height, width, channels = image.shape
+            if image.dtype.kind in 'ui' and height * width * 255 < 2 ** 31:
+                dtype = np.int32
+            elif image.dtype.kind in 'ui':
+                dtype = np.int64
+            else:
+                dtype = np.float64
+            integral = np.zeros((height + 1, width + 1, channels), dtype=dtype)
+            np.cumsum(image, axis=0, dtype=dtype, out=integral[1:, 1:])
+            np.cumsum(integral[1:, 1:], axis=1, out=integral[1:, 1:])
+            self._integral = integral
+        return self._integral
+
+    def __call__(self, word, font_size, font_path, position, orientation,
+                 box_size=None, **kwargs):
+        """Generate a color for a given word using a fixed image.
+
+        ``box_size`` is the bounding box (left, top, right, bottom) of the
+        word, as computed for the layout. If None, the text is measured.
+        """
+        if box_size is None:
+            # get the font to get the box size
+            font = ImageFont.truetype(font_path, font_size)
+            transposed_font = ImageFont.TransposedFont(font,
+                                                       orientation=orientation)
+            # get size of resulting text
+            box_size = transposed_font.getbbox(word, anchor="lt")
+        integral = self._get_integral()
+        # patch under word box, clipped to the image
+        x, y = position
+        x_end = min(x + box_size[3], integral.shape[0] - 1)
+        y_end = min(y + box_size[2], integral.shape[1] - 1)
         # check if the text is within the bounds of the image
-        reshape = patch.reshape(-1, 3)
-        if not np.all(reshape.shape):
+        if x_end <= x or y_end <= y:
             if self.default_color is None:
                 raise ValueError('ImageColorGenerator is smaller than the canvas')
             return "rgb(%d, %d, %d)" % tuple(self.default_color)
-        color = np.mean(reshape, axis=0)
+        total = (integral[x_end, y_end] - integral[x, y_end]
+                 - integral[x_end, y] + integral[x, y])
+        color = total / ((x_end - x) * (y_end - y))
+        if color.shape[0] == 1:
+            # gray-scale image
+            color = np.repeat(color, 3)
         return "rgb(%d, %d, %d)" % tuple(color)
+
+    def batch(self, words, font_sizes, positions, orientations,
+              font_path=None, box_sizes=None, **kwargs):
+        """Colors of many words at once, as an (n, 3) array of uint8.
+
+        ``box_sizes`` is an array of shape (n, 4) with the bounding boxes of
+        the words. If None, the words are measured.
+        """
+        if box_sizes is None:
+            box_sizes = []
+            for word, font_size, orientation in zip(words, font_sizes,
+                                                    orientations):
+                font = ImageFont.TransposedFont(
+                    ImageFont.truetype(font_path, int(font_size)),
+                    orientation=orientation)
+                box_sizes.append(font.getbbox(word, anchor="lt"))
+        box_sizes = np.asarray(box_sizes, dtype=int).reshape(-1, 4)
+        positions = np.asarray(positions, dtype=int).reshape(-1, 2)
+        integral = self._get_integral()
+        # patches under the word boxes, clipped to the image
+        height, width = integral.shape[0] - 1, integral.shape[1] - 1
+        x, y = positions[:, 0], positions[:, 1]
+        x_end = np.minimum(x + box_sizes[:, 3], height)
+        y_end = np.minimum(y + box_sizes[:, 2], width)
+        outside = (x_end <= x) | (y_end <= y)
+        if outside.any() and self.default_color is None:
+            raise ValueError('ImageColorGenerator is smaller than the canvas')
+        x, y = np.minimum(x, height), np.minimum(y, width)
+        x_end, y_end = np.maximum(x_end, x), np.maximum(y_end, y)
+        total = (integral[x_end, y_end] - integral[x, y_end]
+                 - integral[x_end, y] + integral[x, y])
+        area = np.maximum((x_end - x) * (y_end - y), 1)
+        colors = total / area[:, np.newaxis]
+        if colors.shape[1] == 1:
+            # gray-scale image
+            colors = np.repeat(colors, 3, axis=1)
+        colors = colors.astype(np.uint8)
+        if outside.any():
+            colors[outside] = self.default_color
+        return colors
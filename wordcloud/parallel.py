@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+"""Generate and render word clouds in a pool of worker processes.
+
+The settings of a single :class:`WordCloud` are shared by all jobs. Large
+read-only arrays (the mask, the occupancy map computed from it and the image
+of an ImageColorGenerator) are put in shared memory once instead of being
+pickled for every worker, and each worker keeps its fonts loaded between
+jobs.
+"""
+import collections
+import copy
+import itertools
+import os
+import sys
+import weakref
+from concurrent.futures import (ProcessPoolExecutor, FIRST_COMPLETED,
+                                wait)
+
+import numpy as np
+
+from PIL import Image
+
+from .wordcloud import IntegralOccupancyMap
+from .color_from_image import ImageColorGenerator
+from .tokenization import CHUNK_SIZE, WordCounts, iter_shards
+
+# state of a worker process, set up by _init_worker
+_worker = {}
+
+
+class SharedArray(np.ndarray):
+    """Array in shared memory or in a memory-mapped ``.npy`` file.
+
+    Pickling a SharedArray only pickles a reference to its memory, and
+    unpickling it in another process maps the same memory without copying.
+    Use it for large masks and color images of word clouds that are sent to
+    worker processes. Arrays derived from it (views, results of computations)
+    are ordinary arrays and are pickled by value.
+
+    Use :func:`share_array` to create one.
+    """
+    def __array_finalize__(self, obj):
+        self._ref = None
+
+    def __reduce_ex__(self, protocol):
+        if self._ref is None:
+            return np.asarray(self).__reduce_ex__(protocol)
+        return attach_array, (self._ref,)
+
+    def __reduce__(self):
+        return self.__reduce_ex__(2)
+
+
+class _SharedBuffer(object):
+    """Exposes a shared memory block to numpy and keeps it open while used."""
+    def __init__(self, shm, shape, dtype, readonly):
+        self.shm = shm
+        address = np.frombuffer(shm.buf, dtype=np.uint8).ctypes.data
+        self.__array_interface__ = {'version': 3, 'shape': shape,
+                                    'typestr': dtype,
+                                    'data': (address, readonly)}
+
+
+def share_array(array, path=None):
+    """Copy an array to memory that other processes can map.
+
+    Parameters
+    ----------
+    array : nd-array
+        Array to share, for instance the ``mask`` of a WordCloud or the
+        ``image`` of an ImageColorGenerator.
+
+    path : string or None (default=None)
+        If None, the array is copied to a new block of shared memory
+        (``multiprocessing.shared_memory``), which is released once the
+        returned array, all views of it and all its unpickled copies are
+        garbage collected. Otherwise the array is saved to this ``.npy`` file
+        and memory-mapped; the file has to stay in place while it is used.
+
+    Returns
+    -------
+    shared : SharedArray
+        Copy of the array that is pickled by reference.
+    """
+    array = np.asarray(array)
+    if path is not None:
+        np.save(path, array)
+        ref = ('npy', os.path.abspath(path))
+        shared = np.load(path, mmap_mode='r+').view(SharedArray)
+        shared._ref = ref
+        return shared
+
+    # Import here, shared memory needs Python 3.8
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    buffer = _SharedBuffer(shm, array.shape, array.dtype.str, False)
+    weakref.finalize(buffer, _unlink, shm, os.getpid())
+    shared = np.asarray(buffer).view(SharedArray)
+    shared[...] = array
+    shared._ref = ('shm', shm.name, array.shape, array.dtype.str)
+    return shared
+
+
+def _unlink(shm, pid):
+    # forked workers inherit the array but must not release the memory
+    if os.getpid() == pid:
+        shm.unlink()
+
+
+def attach_array(ref):
+    """Map an array shared with :func:`share_array`, without copying.
+
+    This is what unpickling a SharedArray does.
+
+    Returns
+    -------
+    shared : SharedArray
+        Read-only view of the shared array.
+    """
+    if ref[0] == 'npy':
+        shared = np.load(ref[1], mmap_mode='r').view(SharedArray)
+    else:
+        from multiprocessing import shared_memory
+
+        _, name, shape, dtype = ref
+        if sys.version_info >= (3, 13):
+            # only the process that created the memory may release it
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        shared = np.asarray(_SharedBuffer(shm, shape, dtype, True))
+        shared = shared.view(SharedArray)
+    shared._ref = ref
+    return shared
+
+
+def _shared(array):
+    """Share an array unless it already is."""
+    if isinstance(array, SharedArray) and array._ref is not None:
+        return array
+    return share_array(array)
+
+
+def _template(wordcloud):
+    """Copy of a word cloud to send to workers, large arrays are shared."""
+    template = copy.copy(wordcloud)
+    template._canvas = None
+    template._glyphs = None
+    if wordcloud.mask is not None:
+        template.mask = _shared(wordcloud.mask)
+    if isinstance(wordcloud.color_func, ImageColorGenerator):
+        template.color_func = copy.copy(wordcloud.color_func)
+        template.color_func.image = _shared(wordcloud.color_func.image)
+    return template
+
+
+def _init_worker(wordcloud, boolean_mask, integral, save_options):
+    """Keep the word cloud and its occupancy map for all jobs."""
+    occupancy = IntegralOccupancyMap(integral.shape[0], integral.shape[1],
+                                     None)
+    occupancy.integral = integral
+    _worker['wordcloud'] = wordcloud
+    _worker['canvas'] = (boolean_mask, occupancy)
+    _worker['save_options'] = save_options
+
+
+def _generate_job(index, text, filename):
+    """Generate one word cloud in a worker process."""
+    wordcloud = _worker['wordcloud']
+    boolean_mask, occupancy = _worker['canvas']
+    # fonts and rendered words stay cached between jobs
+    wordcloud._canvas = (boolean_mask, occupancy)
+    try:
+        if isinstance(text, str):
+            wordcloud.generate(text)
+        else:
+            wordcloud.generate_from_frequencies(text)
+        if filename is None:
+            return index, wordcloud.layout_, None
+        wordcloud.to_file(filename, **_worker['save_options'])
+        return index, filename, None
+    except Exception as e:
+        return index, None, e
+    finally:
+        wordcloud._canvas = None
+
+
+def generate_many(wordcloud, jobs, n_jobs=None, save_options=None):
+    """Generate many word clouds with the same settings in parallel.
+
+    Parameters
+    ----------
+    wordcloud : WordCloud
+        Word cloud whose settings (size, mask, font, colors, ...) are used
+        for all jobs. It is sent once to every worker, with its mask and the
+        occupancy map of the mask in shared memory.
+
+    jobs : iterable of (text, filename) tuples
+        ``text`` is either a string passed to ``generate`` or a dict of
+        frequencies passed to ``generate_from_frequencies``. If ``filename``
+        is not None the image is written to it with ``to_file``. Jobs are
+        consumed lazily, so this can be a generator.
+
+    n_jobs : int or None (default=None)
+        Number of worker processes. If None, the number of CPUs is used.
+
+    save_options : dict or None (default=None)
+        Keyword arguments of ``to_file`` used to write the images, e.g.
+        ``{'compress_level': 1}``.
+
+    Yields
+    ------
+    index : int
+        Position of the job in ``jobs``. Results are yielded as soon as they
+        are ready, not in the order of the jobs.
+
+    result : string or list
+        ``filename`` if it was given, else the ``layout_`` of the word cloud.
+        None if the job failed.
+
+    error : Exception or None
+        The exception raised by a failed job. Failed jobs don't interrupt the
+        other jobs.
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    boolean_mask, occupancy = wordcloud._new_canvas()
+    template = _template(wordcloud)
+    for attribute in ('layout_', 'words_'):
+        template.__dict__.pop(attribute, None)
+    if wordcloud.mask is not None:
+        boolean_mask = share_array(boolean_mask)
+    integral = share_array(occupancy.integral)
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(template, boolean_mask, integral,
+                                       save_options or {})) as executor:
+        jobs = iter(enumerate(jobs))
+        pending = {}
+        while True:
+            # keep a bounded number of jobs in flight
+            for index, (text, filename) in jobs:
+                future = executor.submit(_generate_job, index, text, filename)
+                pending[future] = index
+                if len(pending) >= 2 * n_jobs:
+                    break
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    # the worker died or the result couldn't be pickled
+                    yield index, None, e
+
+
+def _init_count_worker(wordcloud):
+    """Keep the word cloud whose settings are used to count words."""
+    _worker['wordcloud'] = wordcloud
+
+
+def _count_job(text):
+    """Count the words of a part of a text in a worker process."""
+    return _worker['wordcloud'].count_words(text)
+
+
+def count_words(wordcloud, text, counts=None, n_jobs=None,
+                shard_size=CHUNK_SIZE):
+    """Count the words of a text in parallel.
+
+    The text is split at whitespace into parts that are counted in worker
+    processes and merged in order, which gives the same counts as
+    ``wordcloud.count_words(text)`` as long as its ``regexp`` doesn't match
+    whitespace.
+
+    Parameters
+    ----------
+    wordcloud : WordCloud
+        Word cloud whose settings (stopwords, regexp, ...) are used.
+
+    text : string, file object or iterable of strings
+        Text to count. Parts of it are read as workers are ready for them.
+
+    counts : counts or None (default=None)
+        Counts of the preceding text to add to, see
+        :func:`WordCloud.count_words`. Each part is merged into them as soon
+        as it is counted, so :class:`wordcloud.HeavyHitters` keep bounded
+        memory. If None, new counts are returned.
+
+    n_jobs : int or None (default=None)
+        Number of worker processes. If None, the number of CPUs is used.
+
+    shard_size : int (default=CHUNK_SIZE)
+        Number of characters counted by a worker at once.
+
+    Returns
+    -------
+    counts : WordCounts, HeavyHitters or WindowedCounts
+    """
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    shards = iter_shards(text, shard_size)
+    first = next(shards, '')
+    second = next(shards, None)
+    if n_jobs == 1 or second is None:
+        counts = wordcloud.count_words(first, counts)
+        if second is not None:
+            counts = wordcloud.count_words(second, counts)
+            for shard in shards:
+                counts = wordcloud.count_words(shard, counts)
+        return counts
+
+    if counts is None:
+        counts = WordCounts(collocations=wordcloud.collocations)
+    template = _template(wordcloud)
+    for attribute in ('layout_', 'words_'):
+        template.__dict__.pop(attribute, None)
+    with ProcessPoolExecutor(max_workers=n_jobs,
+                             initializer=_init_count_worker,
+                             initargs=(template,)) as executor:
+        # keep a bounded number of parts in flight, merge them in order
+        pending = collections.deque()
+        for shard in itertools.chain((first, second), shards):
+            pending.append(executor.submit(_count_job, shard))
+            if len(pending) >= 2 * n_jobs:
+                counts.merge(pending.popleft().result())
+        while pending:
+            counts.merge(pending.popleft().result())
+    return counts
+
+
+def _init_render_worker(wordcloud):
+    """Keep the word cloud to render for all tiles."""
+    _worker['wordcloud'] = wordcloud
+
+
+def _render_job(region):
+    """Render one tile in a worker process."""
+    return np.asarray(_worker['wordcloud']._render_region(region))
+
+
+def render_tiles(wordcloud, tile_size=1024, n_jobs=None):
+    """Render the image of a word cloud tile by tile.
+
+    Each tile only draws the words that overlap it, so tiles of a large
+    image (high ``scale``) can be rendered in parallel worker processes and
+    the full image never needs to be in memory at once.
+
+    Parameters
+    ----------
+    wordcloud : WordCloud
+        Generated word cloud to render.
+
+    tile_size : int or tuple of int (default=1024)
+        Height and width of the tiles in pixels of the output image. Tiles
+        at the right and bottom border can be smaller.
+
+    n_jobs : int or None (default=None)
+        Number of worker processes. If None, the number of CPUs is used. If
+        1, the tiles are rendered in this process.
+
+    Yields
+    ------
+    position : tuple of int
+        (row, column) of the top left pixel of the tile in the image. Tiles
+        are yielded row by row, from left to right.
+
+    tile : nd-array
+        Rendered pixels of the tile, like the corresponding part of
+        ``wordcloud.to_array()``. Words are drawn identically; the mask
+        contour can differ in a few pixels at its edge.
+    """
+    wordcloud._check_generated()
+    if np.ndim(tile_size) == 0:
+        tile_size = (tile_size, tile_size)
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    width, height = wordcloud._image_size()
+    regions = ((top, left, min(top + tile_size[0], height),
+                min(left + tile_size[1], width))
+               for top in range(0, height, tile_size[0])
+               for left in range(0, width, tile_size[1]))
+
+    if n_jobs == 1:
+        for region in regions:
+            yield region[:2], np.asarray(wordcloud._render_region(region))
+        return
+
+    with ProcessPoolExecutor(max_workers=n_jobs,
+                             initializer=_init_render_worker,
+                             initargs=(_template(wordcloud),)) as executor:
+        # keep a bounded number of tiles in flight, yield them in order
+        pending = collections.deque()
+        for region in regions:
+            pending.append((region[:2], executor.submit(_render_job, region)))
+            if len(pending) >= 2 * n_jobs:
+                position, future = pending.popleft()
+                yield position, future.result()
+        while pending:
+            position, future = pending.popleft()
+            yield position, future.result()
+
+
+def render_tiled(wordcloud, out=None, tile_size=1024, n_jobs=None):
+    """Render a word cloud with tiles rendered in parallel.
+
+    Faster than ``to_image`` for large images, and with ``out`` a
+    memory-mapped array (see ``numpy.lib.format.open_memmap``), images that
+    don't fit in memory can be rendered.
+
+    Parameters
+    ----------
+    wordcloud : WordCloud
+        Generated word cloud to render.
+
+    out : nd-array or None (default=None)
+        Array of shape (height, width, channels) and dtype uint8 the tiles
+        are written to. If None, a Pillow image is returned.
+
+    tile_size : int or tuple of int (default=1024)
+        Height and width of the tiles.
+
+    n_jobs : int or None (default=None)
+        Number of worker processes. If None, the number of CPUs is used.
+
+    Returns
+    -------
+    image : Image or nd-array
+        ``out`` if it was given, else the rendered image.
+    """
+    width, height = wordcloud._image_size()
+    result = out
+    if out is None:
+        channels = len(Image.new(wordcloud.mode, (1, 1)).getbands())
+        result = np.empty((height, width, channels), dtype=np.uint8)
+    elif out.shape[:2] != (height, width):
+        raise ValueError("Got out of shape %s for an image of %d x %d pixels."
+                         % (str(out.shape), height, width))
+    for (top, left), tile in render_tiles(wordcloud, tile_size=tile_size,
+                                          n_jobs=n_jobs):
+        result[top:top + tile.shape[0], left:left + tile.shape[1]] = \
+            tile.reshape(tile.shape[:2] + result.shape[2:])
+    if out is None:
+        if channels == 1:
+            result = result[:, :, 0]
+        return Image.fromarray(result)
+    return out
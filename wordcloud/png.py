@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Write word clouds to PNG files band by band.
+
+The image is rendered in bands of rows (see :func:`render_tiles`), each band
+is filtered and fed to a zlib stream and the compressed data is written as
+soon as it is available, so only one band of the image is in memory.
+"""
+import struct
+import zlib
+
+import numpy as np
+
+from .parallel import render_tiles
+
+# PNG color type of the supported image modes
+COLOR_TYPES = {'L': 0, 'RGB': 2, 'RGBA': 6}
+
+
+def _chunk(fp, chunk_type, data):
+    fp.write(struct.pack('>I', len(data)))
+    fp.write(chunk_type)
+    fp.write(data)
+    fp.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type))))
+
+
+def write_png(wordcloud, fp, band_height=256, n_jobs=1, compress_level=6,
+              chunk_size=2 ** 16):
+    """Render a word cloud and write it to a PNG file band by band.
+
+    Peak memory is proportional to the size of a band, not of the image.
+
+    Parameters
+    ----------
+    wordcloud : WordCloud
+        Generated word cloud with mode "L", "RGB" or "RGBA".
+
+    fp : string or file object
+        File name or binary file to write to.
+
+    band_height : int (default=256)
+        Number of rows rendered at once.
+
+    n_jobs : int or None (default=1)
+        Number of worker processes rendering bands, see
+        :func:`render_tiles`.
+
+    compress_level : int (default=6)
+        zlib compression level, from 0 (no compression) to 9.
+
+    chunk_size : int (default=2 ** 16)
+        Compressed bytes written per IDAT chunk.
+    """
+    wordcloud._check_generated()
+    if wordcloud.mode not in COLOR_TYPES:
+        raise ValueError("Can only write PNG files band by band for modes %s,"
+                         " got %s." % (", ".join(COLOR_TYPES), wordcloud.mode))
+    if isinstance(fp, str):
+        with open(fp, 'wb') as f:
+            return write_png(wordcloud, f, band_height=band_height,
+                             n_jobs=n_jobs, compress_level=compress_level,
+                             chunk_size=chunk_size)
+
+    width, height = wordcloud._image_size()
+    fp.write(b'\x89PNG\r\n\x1a\n')
+    _chunk(fp, b'IHDR', struct.pack('>IIBBBBB', width, height, 8,
+                                    COLOR_TYPES[wordcloud.mode], 0, 0, 0))
+    compressor = zlib.compressobj(compress_level)
+    data = []
+    size = 0
+    for _, band in render_tiles(wordcloud, tile_size=(band_height, width),
+                                n_jobs=n_jobs):
+        band = band.reshape(band.shape[0], -1)
+        channels = band.shape[1] // width
+        # "Sub" filter: difference to the pixel on the left, modulo 256
+        rows = np.empty((band.shape[0], band.shape[1] + 1), dtype=np.uint8)
+        rows[:, 0] = 1
+        rows[:, 1:channels + 1] = band[:, :channels]
+        np.subtract(band[:, channels:], band[:, :-channels],
+                    out=rows[:, channels + 1:])
+        data.append(compressor.compress(rows.tobytes()))
+        size += len(data[-1])
+        if size >= chunk_size:
+            _chunk(fp, b'IDAT', b''.join(data))
+            data, size = [], 0
+    data.append(compressor.flush())
+    _chunk(fp, b'IDAT', b''.join(data))
+    _chunk(fp, b'IEND', b'')
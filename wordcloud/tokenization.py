@@ -1,8 +1,28 @@
 from __future__ import division
-from itertools import tee
+import codecs
+import re
+from itertools import islice, tee
 from operator import itemgetter
-from collections import defaultdict
+from collections import Counter, defaultdict, deque
+from functools import partial
 from math import log
+from operator import is_not
+
+import numpy as np
+
+# characters of plain text read at once from files
+CHUNK_SIZE = 2 ** 20
+
+# a text can be cut at whitespace without cutting a token
+_WHITESPACE = (' ', '\n', '\t', '\r', '\f', '\v', '\x1c', '\x1d', '\x1e',
+               '\x1f', '\x85', '\xa0', '\u1680', '\u2000', '\u2001', '\u2002',
+               '\u2003', '\u2004', '\u2005', '\u2006', '\u2007', '\u2008',
+               '\u2009', '\u200a', '\u2028', '\u2029', '\u202f', '\u205f',
+               '\u3000')
+
+# number of chunks of text without whitespace carried over to the next chunk,
+# before the text is cut anyway
+_MAX_CARRY = 4
 
 
 def l(k, n, x):  # noqa: E741, E743
@@ -28,6 +48,55 @@ def score(count_bigram, count1, count2, n_words):
     return -2 * score
 
 
+def _l(k, n, x):
+    # l for arrays
+    return (np.log(np.maximum(x, 1e-10)) * k
+            + np.log(np.maximum(1 - x, 1e-10)) * (n - k))
+
+
+def scores(count_bigrams, counts1, counts2, n_words):
+    """Collocation scores of many bigrams at once.
+
+    Parameters
+    ----------
+    count_bigrams, counts1, counts2 : array-like of int
+        Counts of the bigrams and of their first and second words.
+
+    n_words : int
+        Number of words of the text.
+
+    Returns
+    -------
+    scores : nd-array of float
+        ``score`` of each bigram.
+    """
+    return _scores(count_bigrams, counts1, counts2, n_words)[0]
+
+
+def _scores(count_bigrams, counts1, counts2, n_words):
+    """Collocation scores and a bound of their rounding errors."""
+    c12 = np.asarray(count_bigrams, dtype=np.float64)
+    c1 = np.asarray(counts1, dtype=np.float64)
+    c2 = np.asarray(counts2, dtype=np.float64)
+    N = float(n_words)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = c2 / N
+        p1 = c12 / c1
+        p2 = (c2 - c12) / (N - c1)
+        terms = (_l(c12, c1, p), _l(c2 - c12, N - c1, p),
+                 _l(c12, c1, p1), _l(c2 - c12, N - c1, p2))
+        score = terms[0] + terms[1] - terms[2] - terms[3]
+        # the score is a small difference of large terms
+        error = 1e-12 * (np.abs(terms[0]) + np.abs(terms[1])
+                         + np.abs(terms[2]) + np.abs(terms[3]))
+    score = -2 * score
+    # only one words appears in the whole document
+    single = (N <= c1) | (N <= c2)
+    score[single] = 0
+    error[single] = 0
+    return score, error
+
+
 def pairwise(iterable):
     # from itertool recipies
     # is -> (s0,s1), (s1,s2), (s2, s3), ...
@@ -36,29 +105,408 @@ def pairwise(iterable):
     return zip(a, b)
 
 
-def unigrams_and_bigrams(words, stopwords, normalize_plurals=True, collocation_threshold=30):
-    # We must create the bigrams before removing the stopword tokens from the words, or else we get bigrams like
-    # "thank much" from "thank you very much".
-    # We don't allow any of the words in the bigram to be stopwords
-    bigrams = list(p for p in pairwise(words) if not any(w.lower() in stopwords for w in p))
-    unigrams = list(w for w in words if w.lower() not in stopwords)
-    n_words = len(unigrams)
-    counts_unigrams, standard_form = process_tokens(
-        unigrams, normalize_plurals=normalize_plurals)
-    counts_bigrams, standard_form_bigrams = process_tokens(
-        [" ".join(bigram) for bigram in bigrams],
-        normalize_plurals=normalize_plurals)
-    # create a copy of counts_unigram so the score computation is not changed
-    orig_counts = counts_unigrams.copy()
-
-    # Include bigrams that are also collocations
-    for bigram_string, count in counts_bigrams.items():
-        bigram = tuple(bigram_string.split(" "))
-        word1 = standard_form[bigram[0].lower()]
-        word2 = standard_form[bigram[1].lower()]
-
-        collocation_score = score(count, orig_counts[word1], orig_counts[word2], n_words)
-        if collocation_score > collocation_threshold:
+def iter_chunks(text, chunk_size=CHUNK_SIZE):
+    """Iterate over a text given as a string, a file object or an iterable
+    of strings.
+
+    Files are read ``chunk_size`` characters at a time. Binary files and
+    chunks of bytes are decoded as UTF-8.
+    """
+    if isinstance(text, (str, bytes)):
+        text = [text]
+    elif hasattr(text, 'read'):
+        read = text.read
+        text = iter(lambda: read(chunk_size), read(0))
+    decoder = None
+    for chunk in text:
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b'', final=True)
+
+
+def tokenize_chunks(chunks, regexp, flags=0):
+    """Find the tokens of a text given in chunks.
+
+    Yields the list of tokens found in each chunk. Chunks are cut after their
+    last whitespace and the rest is prepended to the next chunk, so a token
+    spanning two chunks is found as if the text was in one piece, as long as
+    ``regexp`` doesn't match whitespace. Text without whitespace, like
+    minified data, is carried over for a few chunks at most, then cut at the
+    end of a chunk.
+
+    Parameters
+    ----------
+    chunks : iterable of strings
+        Consecutive parts of the text.
+
+    regexp : string
+        Regular expression matching the tokens.
+
+    flags : int (default=0)
+        Flags of the regular expression.
+    """
+    findall = re.compile(regexp, flags).findall
+    chunks = iter(chunks)
+    rest = ''
+    n_carried = 0
+    chunk = next(chunks, None)
+    while chunk is not None:
+        next_chunk = next(chunks, None)
+        text = rest + chunk if rest else chunk
+        if next_chunk is None:
+            end = len(text)
+        else:
+            end = max(text.rfind(char) for char in _WHITESPACE) + 1
+            if end > 0:
+                n_carried = 0
+            elif n_carried < _MAX_CARRY:
+                n_carried += 1
+            else:
+                # don't carry over text without whitespace forever
+                n_carried = 0
+                end = len(text)
+        rest = text[end:]
+        yield findall(text, 0, end)
+        chunk = next_chunk
+
+
+def iter_shards(text, shard_size=CHUNK_SIZE):
+    """Split a text at whitespace into parts of about ``shard_size``
+    characters, which can be counted separately and merged.
+
+    Parameters
+    ----------
+    text : string, file object or iterable of strings
+        See :func:`iter_chunks`.
+
+    shard_size : int (default=CHUNK_SIZE)
+        Number of characters of a part, which is cut at the last whitespace
+        before this size, or if there is none at the first one after it. A
+        part without whitespace is cut after a few times this size.
+    """
+    rest = ''
+    for chunk in iter_chunks(text, shard_size):
+        text = rest + chunk if rest else chunk
+        start = 0
+        while len(text) - start > shard_size:
+            end = max(text.rfind(char, start, start + shard_size)
+                      for char in _WHITESPACE) + 1
+            if end <= start:
+                ends = [text.find(char, start + shard_size)
+                        for char in _WHITESPACE]
+                ends = [end for end in ends if end >= 0]
+                if ends:
+                    end = min(ends) + 1
+                elif len(text) - start > _MAX_CARRY * shard_size:
+                    # don't wait for whitespace forever
+                    end = start + _MAX_CARRY * shard_size
+                else:
+                    # wait for whitespace in the next chunk
+                    break
+            yield text[start:end]
+            start = end
+        rest = text[start:]
+    if rest:
+        yield rest
+
+
+class WordCounts(object):
+    """Counts of the words and bigrams of a text, accumulated chunk by chunk.
+
+    Memory depends on the size of the vocabulary, not of the text. Counts of
+    consecutive parts of a text split at whitespace, computed separately (in
+    other processes or on other machines), can be merged into the counts of
+    the whole text, and cases, plurals and collocations are resolved once by
+    ``frequencies``. Word counts can be pickled, or converted to JSON
+    compatible dicts with ``to_dict``.
+
+    Use :func:`WordCloud.count_words` to count a text with the settings of a
+    word cloud, and pass the counts to :func:`WordCloud.process_text` or
+    :func:`WordCloud.generate`.
+
+    Parameters
+    ----------
+    collocations : bool (default=True)
+        Whether to count bigrams.
+
+    Attributes
+    ----------
+    unigrams : dict from string to int
+        Count of each word, with its case, that is not a stopword.
+
+    bigrams : dict from (string, string) to int
+        Count of each pair of consecutive words that are not stopwords.
+
+    n_words : int
+        Number of words that are not stopwords.
+
+    n_tokens : int
+        Number of words, including stopwords.
+
+    first, last : string or None
+        First and last word, None if it is a stopword or if there is no word.
+        Used to count the bigram spanning two merged parts of a text.
+    """
+    # texts with fewer words are counted without numpy
+    _small = 512
+
+    def __init__(self, collocations=True):
+        self.collocations = collocations
+        self.n_words = 0
+        self.n_tokens = 0
+        # words are counted by integer id, in order of first appearance
+        self._ids = {}
+        self._words = []
+        self._counts = []
+        # bigrams of ids (id1, id2) packed in id1 << 32 | id2
+        self._bigrams = {}
+        self._first = self._last = -1
+        # id of each token, -1 for stopwords, valid for _stopwords
+        self._lookup = {}
+        self._stopwords = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the token lookup is rebuilt when needed
+        state['_lookup'] = {}
+        state['_stopwords'] = None
+        return state
+
+    @property
+    def unigrams(self):
+        return dict(zip(self._words, self._counts))
+
+    @property
+    def bigrams(self):
+        words = self._words
+        return {(words[key >> 32], words[key & 0xffffffff]): count
+                for key, count in self._bigrams.items()}
+
+    @property
+    def first(self):
+        return self._words[self._first] if self._first >= 0 else None
+
+    @property
+    def last(self):
+        return self._words[self._last] if self._last >= 0 else None
+
+    def _intern(self, word):
+        """Id of a word that is not a stopword."""
+        i = self._ids.get(word)
+        if i is None:
+            i = self._ids[word] = len(self._words)
+            self._words.append(word)
+            self._counts.append(0)
+        return i
+
+    def add(self, words, stopwords=()):
+        """Count words following the words added before.
+
+        Each distinct word is lowercased and looked up in the stopwords once,
+        then words are counted by integer id.
+
+        Parameters
+        ----------
+        words : list of strings
+            Words of the text, including stopwords.
+
+        stopwords : set of strings
+            Lower case words that are not counted.
+        """
+        if not words:
+            return self
+        if stopwords is not self._stopwords and stopwords != self._stopwords:
+            self._lookup = {}
+        self._stopwords = stopwords
+        lookup = self._lookup
+        # new tokens, in order of first appearance
+        for word in dict.fromkeys(words):
+            if word not in lookup:
+                lookup[word] = (-1 if word.lower() in stopwords
+                                else self._intern(word))
+        if len(words) < self._small:
+            return self._add_ids(list(map(lookup.__getitem__, words)))
+        ids = np.fromiter(map(lookup.__getitem__, words), dtype=np.int64,
+                          count=len(words))
+
+        counted = ids[ids >= 0]
+        if counted.size:
+            unique, counts = np.unique(counted, return_counts=True)
+            counts_ = self._counts
+            for i, count in zip(unique.tolist(), counts.tolist()):
+                counts_[i] += count
+        if self.collocations:
+            # pairs of consecutive words that are not stopwords
+            pairs = np.concatenate(([self._last], ids))
+            pairs = (pairs[:-1] << 32) | pairs[1:]
+            pairs = pairs[(ids >= 0)
+                          & (np.concatenate(([self._last], ids[:-1])) >= 0)]
+            if pairs.size:
+                unique, index, counts = np.unique(pairs, return_index=True,
+                                                  return_counts=True)
+                order = np.argsort(index, kind='stable')
+                bigrams = self._bigrams
+                for key, count in zip(unique[order].tolist(),
+                                      counts[order].tolist()):
+                    bigrams[key] = bigrams.get(key, 0) + count
+        if not self.n_tokens:
+            self._first = int(ids[0])
+        self.n_words += counted.size
+        self.n_tokens += len(words)
+        self._last = int(ids[-1])
+        return self
+
+    def _add_ids(self, ids):
+        """Count a few words by id, in Python, faster than with numpy."""
+        counts = self._counts
+        bigrams = self._bigrams
+        collocations = self.collocations
+        previous = self._last
+        n_words = 0
+        for i in ids:
+            if i < 0:
+                previous = -1
+                continue
+            counts[i] += 1
+            if collocations and previous >= 0:
+                key = previous << 32 | i
+                bigrams[key] = bigrams.get(key, 0) + 1
+            previous = i
+            n_words += 1
+        if not self.n_tokens:
+            self._first = ids[0]
+        self.n_words += n_words
+        self.n_tokens += len(ids)
+        self._last = previous
+        return self
+
+    def merge(self, other):
+        """Add the counts of the text following this one.
+
+        Merging the counts of consecutive parts of a text, in order, gives
+        the counts of the whole text, with the same order of first
+        appearance.
+
+        Parameters
+        ----------
+        other : WordCounts
+            Counts of the text following the text counted so far.
+
+        Returns
+        -------
+        self
+        """
+        if not isinstance(other, WordCounts):
+            raise TypeError("Can't merge %s into WordCounts, only WordCounts."
+                            % type(other).__name__)
+        if other.collocations != self.collocations:
+            raise ValueError("Can't merge word counts with and without"
+                             " collocations.")
+        if not other.n_tokens:
+            return self
+        # ids of the words of other
+        ids = np.array([self._intern(word) for word in other._words] + [-1],
+                       dtype=np.int64)
+        counts = self._counts
+        for i, count in zip(ids.tolist(), other._counts):
+            counts[i] += count
+        bigrams = self._bigrams
+        if self._last >= 0 and other._first >= 0 and self.collocations:
+            # bigram across the boundary of the two texts
+            key = self._last << 32 | int(ids[other._first])
+            bigrams[key] = bigrams.get(key, 0) + 1
+        if other._bigrams:
+            keys = np.fromiter(other._bigrams, dtype=np.int64,
+                               count=len(other._bigrams))
+            keys = (ids[keys >> 32] << 32) | ids[keys & 0xffffffff]
+            for key, count in zip(keys.tolist(), other._bigrams.values()):
+                bigrams[key] = bigrams.get(key, 0) + count
+        if not self.n_tokens:
+            self._first = int(ids[other._first])
+        self.n_words += other.n_words
+        self.n_tokens += other.n_tokens
+        self._last = int(ids[other._last])
+        return self
+
+    def to_dict(self):
+        """Counts as a dict of lists, strings and numbers, e.g. for JSON."""
+        return {'collocations': self.collocations,
+                'unigrams': list(self.unigrams.items()),
+                'bigrams': [[word1, word2, count] for (word1, word2), count
+                            in self.bigrams.items()],
+                'n_words': self.n_words, 'n_tokens': self.n_tokens,
+                'first': self.first, 'last': self.last}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Counts from the result of ``to_dict``."""
+        counts = cls(collocations=state['collocations'])
+        intern = counts._intern
+        for word, count in state['unigrams']:
+            i = intern(word)
+            counts._counts[i] = count
+        counts._bigrams = {intern(word1) << 32 | intern(word2): count
+                           for word1, word2, count in state['bigrams']}
+        counts.n_words = state['n_words']
+        counts.n_tokens = state['n_tokens']
+        if state['first'] is not None:
+            counts._first = intern(state['first'])
+        if state['last'] is not None:
+            counts._last = intern(state['last'])
+        return counts
+
+    def frequencies(self, normalize_plurals=True, collocation_threshold=30):
+        """Word frequencies, with cases and plurals merged and collocations
+        included, as computed by ``WordCloud.process_text``.
+
+        Returns
+        -------
+        counts : dict from string to int
+        """
+        counts_unigrams, standard_form = _fuse_cases(
+            self.unigrams, normalize_plurals=normalize_plurals)
+        counts_bigrams, standard_form_bigrams = _fuse_cases(
+            {" ".join(bigram): count
+             for bigram, count in self.bigrams.items()},
+            normalize_plurals=normalize_plurals)
+        n_words = self.n_words
+        # create a copy of counts_unigram so the score computation is not changed
+        orig_counts = counts_unigrams.copy()
+
+        # score all bigrams at once
+        bigram_strings = list(counts_bigrams)
+        words1, words2 = [], []
+        for bigram_string in bigram_strings:
+            bigram = tuple(bigram_string.split(" "))
+            words1.append(standard_form[bigram[0].lower()])
+            words2.append(standard_form[bigram[1].lower()])
+        counts = [counts_bigrams[bigram_string]
+                  for bigram_string in bigram_strings]
+        counts1 = [orig_counts[word1] for word1 in words1]
+        counts2 = [orig_counts[word2] for word2 in words2]
+        if len(counts) < 64:
+            # faster without numpy
+            collocation_scores = np.array(
+                [score(count, count1, count2, n_words) for count, count1, count2
+                 in zip(counts, counts1, counts2)], dtype=np.float64)
+        else:
+            collocation_scores, error = _scores(counts, counts1, counts2,
+                                                n_words)
+            # np.log can differ from math.log in the last bit, scores this
+            # close to the threshold are computed like before
+            close = np.abs(collocation_scores - collocation_threshold) <= error
+            for i in np.flatnonzero(close):
+                collocation_scores[i] = score(counts[i], counts1[i],
+                                              counts2[i], n_words)
+
+        # Include bigrams that are also collocations
+        for i in np.flatnonzero(collocation_scores > collocation_threshold):
+            bigram_string, word1, word2 = (bigram_strings[i], words1[i],
+                                           words2[i])
             # bigram is a collocation
             # discount words in unigrams dict. hack because one word might
             # appear in multiple collocations at the same time
@@ -66,10 +514,612 @@ def unigrams_and_bigrams(words, stopwords, normalize_plurals=True, collocation_t
             counts_unigrams[word1] -= counts_bigrams[bigram_string]
             counts_unigrams[word2] -= counts_bigrams[bigram_string]
             counts_unigrams[bigram_string] = counts_bigrams[bigram_string]
-    for word, count in list(counts_unigrams.items()):
-        if count <= 0:
-            del counts_unigrams[word]
-    return counts_unigrams
+        for word, count in list(counts_unigrams.items()):
+            if count <= 0:
+                del counts_unigrams[word]
+        return counts_unigrams
+
+
+class _SpaceSaving(object):
+    """Space-Saving summary of the counts of at most ``2 * capacity`` items.
+
+    ``counts`` holds an upper bound of the count of each monitored item and
+    ``errors`` by how much it may exceed the true count. Items that are not
+    monitored were counted at most ``floor`` times.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+
+    def update(self, counts, errors=None, floor=0):
+        """Add the counts of other items, with their errors (exact counts if
+        None) and the upper bound of the items missing from counts."""
+        own_counts = self.counts
+        own_errors = self.errors
+        own_floor = self.floor
+        for item, count in counts.items():
+            error = errors[item] if errors else 0
+            if item in own_counts:
+                own_counts[item] += count
+                own_errors[item] += error
+            else:
+                # the item was counted at most floor times before
+                own_counts[item] = own_floor + count
+                own_errors[item] = own_floor + error
+        if floor:
+            for item in own_counts:
+                if item not in counts:
+                    own_counts[item] += floor
+                    own_errors[item] += floor
+            self.floor += floor
+        if len(own_counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        """Keep the capacity items with the largest counts."""
+        own_counts = self.counts
+        items = list(own_counts)
+        counts = np.fromiter(own_counts.values(), dtype=np.int64,
+                             count=len(items))
+        n_evicted = len(items) - self.capacity
+        evicted = np.argpartition(counts, n_evicted)[:n_evicted]
+        # all kept counts are at least the largest evicted count, which bounds
+        # the counts of items that aren't monitored
+        self.floor = max(self.floor, int(counts[evicted].max()))
+        for i in evicted.tolist():
+            del own_counts[items[i]]
+            del self.errors[items[i]]
+
+
+class HeavyHitters(object):
+    """Approximate counts of the most frequent words and bigrams of a text,
+    in bounded memory.
+
+    Words and bigrams are counted with the Space-Saving algorithm, keeping
+    at most ``2 * capacity`` counts of each, whatever the size of the
+    vocabulary, so unbounded streams of text can be counted. Every word or
+    bigram counted more than ``n_words / capacity`` times is kept, and kept
+    counts exceed the true counts by at most ``error``, which is at most
+    ``n_words / capacity``. Counts are exact as long as the vocabulary fits.
+
+    Heavy hitters can be used instead of :class:`wordcloud.WordCounts`: pass
+    them to :func:`WordCloud.count_words` to count a text, and to
+    :func:`WordCloud.process_text` or :func:`WordCloud.generate`, or use
+    ``frequencies`` to get only the words that can be among the
+    ``max_words`` most frequent ones.
+
+    Parameters
+    ----------
+    capacity : int (default=10000)
+        Number of words, and of bigrams, whose counts are kept.
+
+    collocations : bool (default=True)
+        Whether to count bigrams.
+
+    Attributes
+    ----------
+    unigrams : dict from string to int
+        Upper bound of the count of each word kept, with its case.
+
+    bigrams : dict from (string, string) to int
+        Upper bound of the count of each pair of consecutive words kept.
+
+    error : int
+        Upper bound of the error of the counts.
+
+    n_words : int
+        Number of words that are not stopwords.
+
+    n_tokens : int
+        Number of words, including stopwords.
+
+    first, last : string or None
+        First and last word, None if it is a stopword or if there is no word.
+    """
+
+    def __init__(self, capacity=10000, collocations=True):
+        if capacity < 1:
+            raise ValueError("capacity must be positive, got %r." % capacity)
+        self.capacity = capacity
+        self.collocations = collocations
+        self.n_words = 0
+        self.n_tokens = 0
+        self.first = self.last = None
+        self._unigrams = _SpaceSaving(capacity)
+        self._bigrams = _SpaceSaving(capacity)
+
+    @property
+    def unigrams(self):
+        return dict(self._unigrams.counts)
+
+    @property
+    def bigrams(self):
+        return dict(self._bigrams.counts)
+
+    @property
+    def error(self):
+        return max(self._unigrams.floor, self._bigrams.floor)
+
+    def add(self, words, stopwords=()):
+        """Count words following the words added before.
+
+        Parameters
+        ----------
+        words : list of strings
+            Words of the text, including stopwords.
+
+        stopwords : set of strings
+            Lower case words that are not counted.
+        """
+        if not words:
+            return self
+        dropped = {word for word in dict.fromkeys(words)
+                   if word.lower() in stopwords}
+        # stopwords are replaced by None, which ends bigrams
+        words = [None if word in dropped else word for word in words]
+        counts = Counter(words)
+        n_dropped = counts.pop(None, 0)
+        self._unigrams.update(counts)
+        if self.collocations:
+            pairs = Counter(zip([self.last] + words[:-1], words))
+            self._bigrams.update({
+                pair: count for pair, count in pairs.items()
+                if pair[0] is not None and pair[1] is not None})
+        if not self.n_tokens:
+            self.first = words[0]
+        self.n_words += len(words) - n_dropped
+        self.n_tokens += len(words)
+        self.last = words[-1]
+        return self
+
+    def merge(self, other):
+        """Add the counts of the text following this one.
+
+        Parameters
+        ----------
+        other : HeavyHitters or WordCounts
+            Counts of the text following the text counted so far.
+
+        Returns
+        -------
+        self
+        """
+        if not isinstance(other, (HeavyHitters, WordCounts)):
+            raise TypeError("Can't merge %s into HeavyHitters, only"
+                            " HeavyHitters or WordCounts."
+                            % type(other).__name__)
+        if other.collocations != self.collocations:
+            raise ValueError("Can't merge word counts with and without"
+                             " collocations.")
+        if not other.n_tokens:
+            return self
+        if (self.collocations and self.last is not None
+                and other.first is not None):
+            # bigram across the boundary of the two texts
+            self._bigrams.update({(self.last, other.first): 1})
+        if isinstance(other, HeavyHitters):
+            for own, summary in ((self._unigrams, other._unigrams),
+                                 (self._bigrams, other._bigrams)):
+                own.update(summary.counts, summary.errors, summary.floor)
+        else:
+            self._unigrams.update(other.unigrams)
+            self._bigrams.update(other.bigrams)
+        if not self.n_tokens:
+            self.first = other.first
+        self.n_words += other.n_words
+        self.n_tokens += other.n_tokens
+        self.last = other.last
+        return self
+
+    def frequencies(self, normalize_plurals=True, collocation_threshold=30,
+                    max_words=None):
+        """Word frequencies, with cases and plurals merged and collocations
+        included, computed from the counts kept like ``WordCounts``.
+
+        Parameters
+        ----------
+        normalize_plurals : bool (default=True)
+            Whether to merge plurals ending in "s" with their singular.
+
+        collocation_threshold : int (default=30)
+            Dunning log-likelihood score above which bigrams are
+            collocations.
+
+        max_words : int or None (default=None)
+            If given, only the words and bigrams whose count can be among
+            the ``max_words`` largest counts are used. They are selected
+            before cases, plurals and collocations are merged.
+
+        Returns
+        -------
+        counts : dict from string to int
+        """
+        unigrams = self._unigrams.counts
+        bigrams = self._bigrams.counts
+        if max_words is not None and len(unigrams) > max_words:
+            # max_words words were surely counted this many times
+            lower = (np.fromiter(unigrams.values(), dtype=np.int64)
+                     - np.fromiter(self._unigrams.errors.values(),
+                                   dtype=np.int64))
+            threshold = np.partition(lower, -max_words)[-max_words]
+            unigrams = {word: count for word, count in unigrams.items()
+                        if count >= threshold}
+            bigrams = {bigram: count for bigram, count in bigrams.items()
+                       if count >= threshold}
+        # upper bounds of bigrams can exceed the ones of their words
+        state = {'collocations': self.collocations,
+                 'unigrams': list(unigrams.items()),
+                 'bigrams': [[word1, word2, min(count, unigrams[word1],
+                                                unigrams[word2])]
+                             for (word1, word2), count in bigrams.items()
+                             if word1 in unigrams and word2 in unigrams],
+                 'n_words': self.n_words, 'n_tokens': self.n_tokens,
+                 'first': None, 'last': None}
+        return WordCounts.from_dict(state).frequencies(
+            normalize_plurals=normalize_plurals,
+            collocation_threshold=collocation_threshold)
+
+
+class WindowedCounts(object):
+    """Weighted counts of the most recent parts of a stream of text.
+
+    Text is counted into the current bucket, e.g. the current minute, until
+    ``rotate`` starts a new one. Only the last ``n_buckets`` buckets are
+    counted, older ones expire, and each bucket can weigh ``decay`` times
+    less than the next one. Adding text, rotating and expiring only update
+    the counts of the words involved. ``frequencies`` resolves cases, plurals
+    and collocations on the weighted counts of all the buckets, like
+    :class:`wordcloud.WordCounts`, without tokenizing the text again.
+
+    Pass windowed counts to :func:`WordCloud.count_words` to add text, and
+    to :func:`WordCloud.process_text` or :func:`WordCloud.generate`. Bigrams
+    spanning two buckets are not counted.
+
+    Parameters
+    ----------
+    n_buckets : int or None (default=None)
+        Number of buckets counted, including the current one. If None,
+        buckets never expire.
+
+    decay : float (default=1)
+        Weight of a bucket relative to the next one, in (0, 1]. With 1, all
+        buckets have the same weight and counts are integers.
+
+    collocations : bool (default=True)
+        Whether to count bigrams.
+
+    Attributes
+    ----------
+    current : WordCounts
+        Counts of the current bucket.
+
+    unigrams : dict from string to number
+        Weighted count of each word, with its case, that is not a stopword.
+
+    bigrams : dict from (string, string) to number
+        Weighted count of each pair of consecutive words.
+
+    n_words : number
+        Weighted number of words that are not stopwords.
+    """
+    # weights of closed buckets are rescaled before they get this large
+    _max_weight = 2.0 ** 64
+
+    def __init__(self, n_buckets=None, decay=1, collocations=True):
+        if n_buckets is not None and n_buckets < 1:
+            raise ValueError("n_buckets must be positive or None, got %r."
+                             % n_buckets)
+        if not 0 < decay <= 1:
+            raise ValueError("decay must be in (0, 1], got %r." % decay)
+        self.n_buckets = n_buckets
+        self.decay = decay
+        self.collocations = collocations
+        self.current = WordCounts(collocations=collocations)
+        # closed buckets with their index, oldest first
+        self._buckets = deque()
+        self._index = 0
+        # counts of the closed buckets, bucket i weighted by
+        # decay ** (_base - i) so that older buckets decay without updates
+        self._base = 0
+        self._unigrams = {}
+        self._bigrams = {}
+        self._n_words = 0
+        # number of closed buckets counting each word and bigram
+        self._refs = {}
+
+    def _weight(self, index):
+        if self.decay == 1:
+            return 1
+        return self.decay ** (self._base - index)
+
+    def _update(self, counts, weight):
+        """Add the counts of a bucket, or remove them if weight < 0."""
+        refs = self._refs
+        step = 1 if weight > 0 else -1
+        for totals, items in ((self._unigrams, counts.unigrams.items()),
+                              (self._bigrams, counts.bigrams.items())):
+            for key, count in items:
+                n_refs = refs.get(key, 0) + step
+                if n_refs:
+                    refs[key] = n_refs
+                    totals[key] = totals.get(key, 0) + weight * count
+                else:
+                    # removed exactly, without rounding errors
+                    del refs[key]
+                    del totals[key]
+        self._n_words += weight * counts.n_words
+
+    def add(self, words, stopwords=()):
+        """Count words in the current bucket, see ``WordCounts.add``."""
+        self.current.add(words, stopwords)
+        return self
+
+    def merge(self, other):
+        """Add counts to the current bucket, see ``WordCounts.merge``.
+
+        Windowed counts can't be merged, as their buckets needn't cover the
+        same periods of time.
+        """
+        if not isinstance(other, WordCounts):
+            raise TypeError("Can't merge %s into WindowedCounts, only"
+                            " WordCounts." % type(other).__name__)
+        self.current.merge(other)
+        return self
+
+    def rotate(self):
+        """Close the current bucket and start a new one.
+
+        If there are more than ``n_buckets`` buckets, the oldest one expires.
+
+        Returns
+        -------
+        self
+        """
+        if self._weight(self._index) > self._max_weight:
+            # rescale the weights, rarely enough to be amortized
+            scale = 1 / self._weight(self._index)
+            for totals in (self._unigrams, self._bigrams):
+                for key in totals:
+                    totals[key] *= scale
+            self._n_words *= scale
+            self._base = self._index
+        self._update(self.current, self._weight(self._index))
+        self._buckets.append((self._index, self.current))
+        self._index += 1
+        self.current = WordCounts(collocations=self.collocations)
+        while (self.n_buckets is not None
+               and len(self._buckets) >= self.n_buckets):
+            index, counts = self._buckets.popleft()
+            self._update(counts, -self._weight(index))
+        if not self._buckets:
+            self._n_words = 0
+        return self
+
+    def _counts(self):
+        """Counts of all buckets, weighted relative to the current one."""
+        unigrams = self._unigrams
+        bigrams = self._bigrams
+        if self.n_buckets is not None and self._buckets:
+            # in order of first appearance in the buckets counted, as if
+            # their text was counted at once, which decides ties of cases
+            unigrams = {word: unigrams[word] for _, counts in self._buckets
+                        for word in counts.unigrams}
+            bigrams = {bigram: bigrams[bigram] for _, counts in self._buckets
+                       for bigram in counts.bigrams}
+        n_words = self._n_words
+        if self.decay == 1:
+            unigrams = dict(unigrams)
+            bigrams = dict(bigrams)
+        else:
+            scale = 1 / self._weight(self._index)
+            unigrams = {word: count * scale
+                        for word, count in unigrams.items()}
+            bigrams = {bigram: count * scale
+                       for bigram, count in bigrams.items()}
+            n_words *= scale
+        for totals, counts in ((unigrams, self.current.unigrams),
+                               (bigrams, self.current.bigrams)):
+            for key, count in counts.items():
+                totals[key] = totals.get(key, 0) + count
+        return unigrams, bigrams, n_words + self.current.n_words
+
+    @property
+    def unigrams(self):
+        return self._counts()[0]
+
+    @property
+    def bigrams(self):
+        return self._counts()[1]
+
+    @property
+    def n_words(self):
+        return self._counts()[2]
+
+    def frequencies(self, normalize_plurals=True, collocation_threshold=30):
+        """Word frequencies of the weighted counts, with cases and plurals
+        merged and collocations included, see ``WordCounts.frequencies``.
+
+        Returns
+        -------
+        counts : dict from string to number
+        """
+        unigrams, bigrams, n_words = self._counts()
+        state = {'collocations': self.collocations,
+                 'unigrams': list(unigrams.items()),
+                 'bigrams': [[word1, word2, count] for (word1, word2), count
+                             in bigrams.items()],
+                 'n_words': n_words, 'n_tokens': 0,
+                 'first': None, 'last': None}
+        return WordCounts.from_dict(state).frequencies(
+            normalize_plurals=normalize_plurals,
+            collocation_threshold=collocation_threshold)
+
+
+class TextPipeline(object):
+    """Tokenize and count texts with fixed settings.
+
+    The regular expression is compiled, the stopwords are lowercased and the
+    filters (possessives, numbers, short words) are fused into one mapping of
+    each distinct token to its word, which is cached. Building the pipeline
+    once makes processing many short texts much cheaper than calling
+    ``WordCloud.process_text`` on each. A pipeline can be used by many
+    threads at once.
+
+    Use :func:`WordCloud.text_pipeline` to get the pipeline of a word cloud.
+    The parameters have the same meaning as for ``WordCloud``.
+
+    Parameters
+    ----------
+    stopwords : iterable of strings or None (default=None)
+        Words that are not counted, in any case. None for no stopwords.
+
+    regexp : string or None (default=None)
+        Regular expression matching the tokens.
+
+    min_word_length : int (default=0)
+        Minimum number of letters of a word.
+
+    include_numbers : bool (default=False)
+        Whether to count numbers.
+
+    collocations : bool (default=True)
+        Whether to count bigrams.
+
+    normalize_plurals : bool (default=True)
+        Whether to merge plurals ending in "s" with their singular.
+
+    collocation_threshold : int (default=30)
+        Dunning log-likelihood score above which bigrams are collocations.
+
+    tokenizer : callable or None (default=None)
+        Function returning the tokens of a text, see ``WordCloud``.
+    """
+    # number of tokens whose word is cached
+    cache_size = 2 ** 20
+    # number of characters, and of parts of a text, given to the tokenizer
+    shard_size = 2 ** 16
+    batch_size = 16
+
+    def __init__(self, stopwords=None, regexp=None, min_word_length=0,
+                 include_numbers=False, collocations=True,
+                 normalize_plurals=True, collocation_threshold=30,
+                 tokenizer=None):
+        if regexp is None and tokenizer is not None:
+            # only used to drop whitespace and punctuation tokens
+            regexp = r"\w"
+        elif regexp is None:
+            regexp = r"\w[\w']*" if min_word_length <= 1 else r"\w[\w']+"
+        self.pattern = re.compile(regexp)
+        self.tokenizer = tokenizer
+        self.stopwords = frozenset(word.lower() for word in stopwords or ())
+        self.min_word_length = min_word_length
+        self.include_numbers = include_numbers
+        self.collocations = collocations
+        self.normalize_plurals = normalize_plurals
+        self.collocation_threshold = collocation_threshold
+        # word of each token seen, False for tokens that are dropped
+        self._words = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_words'] = {}
+        return state
+
+    def _word(self, token):
+        """Word of a token, False if the token is dropped."""
+        if self.tokenizer is not None:
+            token = token.strip()
+            if not self.pattern.match(token):
+                return False
+        # remove 's
+        word = token[:-2] if token.lower().endswith("'s") else token
+        # remove numbers
+        if not self.include_numbers and word.isdigit():
+            return False
+        # remove short words
+        if self.min_word_length and len(word) < self.min_word_length:
+            return False
+        return word
+
+    def words(self, tokens):
+        """Words of a list of tokens, including stopwords."""
+        cache = self._words
+        if len(cache) > self.cache_size:
+            cache = self._words = {}
+        for token in dict.fromkeys(tokens):
+            if token not in cache:
+                cache[token] = self._word(token)
+        words = list(map(cache.__getitem__, tokens))
+        if False in words:
+            words = list(filter(partial(is_not, False), words))
+        return words
+
+    def count(self, text, counts=None):
+        """Count the words of a text.
+
+        Parameters
+        ----------
+        text : string, file object or iterable of strings
+            Text, tokenized chunk by chunk, see :func:`tokenize_chunks`.
+
+        counts : counts or None (default=None)
+            Counts of the preceding text to add to, WordCounts, HeavyHitters
+            or WindowedCounts.
+
+        Returns
+        -------
+        counts : WordCounts, HeavyHitters or WindowedCounts
+        """
+        if counts is None:
+            counts = WordCounts(collocations=self.collocations)
+        if self.tokenizer is None:
+            tokens = tokenize_chunks(iter_chunks(text), self.pattern)
+        else:
+            tokens = self.segment(iter_shards(text, self.shard_size))
+        for tokens in tokens:
+            counts.add(self.words(tokens), self.stopwords)
+        return counts
+
+    def segment(self, texts):
+        """Yield the list of tokens of each text, found by the tokenizer.
+
+        If the tokenizer has a ``batch`` method, it is given lists of
+        ``batch_size`` texts and returns the tokens of each text.
+        """
+        tokenizer = self.tokenizer
+        batch = getattr(tokenizer, 'batch', None)
+        if batch is None:
+            for text in texts:
+                yield list(tokenizer(text))
+            return
+        texts = iter(texts)
+        texts_batch = list(islice(texts, self.batch_size))
+        while texts_batch:
+            for tokens in batch(texts_batch):
+                yield list(tokens)
+            texts_batch = list(islice(texts, self.batch_size))
+
+    def process(self, text):
+        """Word frequencies of a text or of its counts, like
+        ``WordCloud.process_text``."""
+        if isinstance(text, (WordCounts, HeavyHitters, WindowedCounts)):
+            counts = text
+        else:
+            counts = self.count(text)
+        return counts.frequencies(self.normalize_plurals,
+                                  self.collocation_threshold)
+
+
+def unigrams_and_bigrams(words, stopwords, normalize_plurals=True, collocation_threshold=30):
+    # We must create the bigrams before removing the stopword tokens from the words, or else we get bigrams like
+    # "thank much" from "thank you very much".
+    # We don't allow any of the words in the bigram to be stopwords
+    counts = WordCounts().add(words, stopwords)
+    return counts.frequencies(normalize_plurals=normalize_plurals,
+                              collocation_threshold=collocation_threshold)
 
 
 def process_tokens(words, normalize_plurals=True):
@@ -97,17 +1147,25 @@ def process_tokens(words, normalize_plurals=True):
     standard_forms : dict from string to string
         For each lower-case word the standard capitalization.
     """
-    # words can be either a list of unigrams or bigrams
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    return _fuse_cases(counts, normalize_plurals=normalize_plurals)
+
+
+def _fuse_cases(counts, normalize_plurals=True):
+    """Merge the cases and plurals of counted words, see process_tokens."""
+    # words can be either unigrams or bigrams
     # d is a dict of dicts.
     # Keys of d are word.lower(). Values are dicts
     # counting frequency of each capitalization
     d = defaultdict(dict)
-    for word in words:
+    for word, count in counts.items():
         word_lower = word.lower()
         # get dict of cases for word_lower
         case_dict = d[word_lower]
         # increase this case
-        case_dict[word] = case_dict.get(word, 0) + 1
+        case_dict[word] = case_dict.get(word, 0) + count
     if normalize_plurals:
         # merge plurals into the singular count (simple cases only)
         merged_plurals = {}
@@ -12,12 +12,17 @@ import warnings
 from random import Random
 import io
 import os
-import re
 import base64
-import sys
+import zlib
+import collections
+import hashlib
 import colorsys
+import heapq
+import itertools
 import matplotlib
 import numpy as np
+from functools import lru_cache
+from itertools import chain
 from operator import itemgetter
 from xml.sax import saxutils
 
@@ -28,7 +33,9 @@ from PIL import ImageFilter
 from PIL import ImageFont
 
 from .query_integral_image import query_integral_image
-from .tokenization import unigrams_and_bigrams, process_tokens
+from .tokenization import (HeavyHitters, TextPipeline, WindowedCounts,
+                           WordCounts)
+from .color_from_image import ImageColorGenerator
 
 FILE = os.path.dirname(__file__)
 FONT_PATH = os.environ.get('FONT_PATH', os.path.join(FILE, 'DroidSansMono.ttf'))
@@ -45,10 +52,30 @@ class IntegralOccupancyMap(object):
                                       axis=0).astype(np.uint32)
         else:
             self.integral = np.zeros((height, width), dtype=np.uint32)
+        # box sizes for which no free position was found. The map only ever
+        # fills up, so any box at least as large won't fit either.
+        self._no_room = []
+
+    def copy(self):
+        """Copy of the map that can be filled independently."""
+        occupancy = IntegralOccupancyMap.__new__(IntegralOccupancyMap)
+        occupancy.height = self.height
+        occupancy.width = self.width
+        occupancy.integral = self.integral.copy()
+        occupancy._no_room = list(self._no_room)
+        return occupancy
 
     def sample_position(self, size_x, size_y, random_state):
-        return query_integral_image(self.integral, size_x, size_y,
-                                    random_state)
+        for no_room_x, no_room_y in self._no_room:
+            if size_x >= no_room_x and size_y >= no_room_y:
+                return None
+        result = query_integral_image(self.integral, size_x, size_y,
+                                      random_state)
+        if result is None:
+            self._no_room = [(x, y) for x, y in self._no_room
+                             if x < size_x or y < size_y]
+            self._no_room.append((size_x, size_y))
+        return result
 
     def update(self, img_array, pos_x, pos_y):
         partial_integral = np.cumsum(np.cumsum(img_array[pos_x:, pos_y:],
@@ -67,6 +94,261 @@ class IntegralOccupancyMap(object):
         self.integral[pos_x:, pos_y:] = partial_integral
 
 
+@lru_cache(maxsize=256)
+def _truetype(font_path, font_size):
+    """Load a font, reusing fonts that were already loaded in this process."""
+    return ImageFont.truetype(font_path, font_size)
+
+
+@lru_cache(maxsize=32)
+def _file_digest(path, mtime, size):
+    """SHA-1 of a file, cached while its modification time and size match."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _digest(path):
+    stat = os.stat(path)
+    return _file_digest(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=8)
+def _read_font_url(digest, path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    mime = 'font-woff2' if data[:4] == b'wOF2' else 'font-woff'
+    data = base64.b64encode(data).decode('ascii')
+    return 'data:application/{};charset=utf-8;base64,{}'.format(mime, data)
+
+
+def _font_url(path):
+    """Data URL of a WOFF or WOFF2 font file."""
+    return _read_font_url(_digest(path), path)
+
+
+# WOFF subsets of fonts, by (font digest, characters, optimize)
+_subset_cache = collections.OrderedDict()
+
+
+def _subset_font_url(font_path, characters, optimize):
+    """Data URL of a WOFF subset of a font with the given characters."""
+    key = (_digest(font_path), characters, optimize)
+    url = _subset_cache.get(key)
+    if url is not None:
+        _subset_cache.move_to_end(key)
+        return url
+
+    # Import here, to avoid hard dependency on fonttools
+    import fontTools.subset
+
+    # Subset options
+    options = fontTools.subset.Options(
+
+        # Small impact on character shapes, but reduce size a lot
+        hinting=not optimize,
+
+        # On small subsets, can improve size
+        desubroutinize=optimize,
+
+        # Try to be lenient
+        ignore_missing_glyphs=True,
+    )
+
+    # Load and subset font
+    ttf = fontTools.subset.load_font(font_path, options)
+    subsetter = fontTools.subset.Subsetter(options)
+    subsetter.populate(text=characters)
+    subsetter.subset(ttf)
+
+    # Export as WOFF
+    ttf.flavor = 'woff'
+    buffer = io.BytesIO()
+    ttf.save(buffer)
+    data = base64.b64encode(buffer.getbuffer()).decode('ascii')
+    url = 'data:application/font-woff;charset=utf-8;base64,' + data
+    _subset_cache[key] = url
+    if len(_subset_cache) > 32:
+        _subset_cache.popitem(last=False)
+    return url
+
+
+class GlyphCache(object):
+    """Cache of text boxes and rasterized words for a single font.
+
+    Rasterizing a word once and pasting the resulting grey-scale sprite gives
+    the same pixels as drawing it with ``ImageDraw.text`` at that position,
+    so words that are placed several times (``repeat=True``) are only
+    measured and rendered once per font size and orientation.
+
+    Parameters
+    ----------
+    font_path : string
+        Font path to the font that will be used (OTF or TTF).
+
+    max_pixels : int (default=2 ** 26)
+        Total size of the cached sprites above which the cache is emptied.
+
+    max_entries : int (default=2 ** 15)
+        Number of cached boxes, extents and metrics above which each of
+        these caches is emptied.
+    """
+    def __init__(self, font_path, max_pixels=2 ** 26, max_entries=2 ** 15):
+        self.font_path = font_path
+        self.max_pixels = max_pixels
+        self.max_entries = max_entries
+        self._draw = ImageDraw.Draw(Image.new("L", (1, 1)))
+        self._boxes = {}
+        self._extents = {}
+        self._metrics = {}
+        self._sprites = {}
+        self._n_pixels = 0
+
+    def font(self, font_size, orientation=None):
+        """Get the (optionally transposed) font for a given size."""
+        font = _truetype(self.font_path, font_size)
+        return ImageFont.TransposedFont(font, orientation=orientation)
+
+    def _store(self, cache, key, value):
+        """Cache a box, extent or metrics, emptying the cache when full."""
+        if len(cache) >= self.max_entries:
+            cache.clear()
+        cache[key] = value
+
+    def box(self, word, font_size, orientation=None):
+        """Bounding box of ``word`` as given by ``ImageDraw.textbbox``."""
+        key = (word, font_size, orientation)
+        box = self._boxes.get(key)
+        if box is None:
+            box = self._draw.textbbox((0, 0), word, anchor="lt",
+                                      font=self.font(font_size, orientation))
+            self._store(self._boxes, key, box)
+        return box
+
+    def extent(self, word, font_size, orientation=None):
+        """Pixels the rendered word can cover, relative to its position.
+
+        Returns
+        -------
+        extent : tuple of int
+            (top, left, bottom, right) of the sprite of ``word``.
+        """
+        key = (word, font_size, orientation)
+        extent = self._extents.get(key)
+        if extent is None:
+            left, top, right, bottom = self._draw.textbbox(
+                (0, 0), word, font=self.font(font_size, orientation))
+            left, top = min(left, 0), min(top, 0)
+            extent = (top, left, max(bottom, top + 1), max(right, left + 1))
+            self._store(self._extents, key, extent)
+        return extent
+
+    def metrics(self, word, font_size):
+        """Horizontal extent and ascent of ``word`` as used in SVG export.
+
+        Returns
+        -------
+        metrics : tuple of int
+            (min_x, max_x, max_y) of the text relative to its position.
+        """
+        key = (word, font_size)
+        metrics = self._metrics.get(key)
+        if metrics is None:
+            font = _truetype(self.font_path, font_size)
+            (size_x, size_y), (offset_x, offset_y) = font.font.getsize(word)
+            ascent, descent = font.getmetrics()
+            metrics = (-offset_x, size_x - offset_x, ascent - offset_y)
+            self._store(self._metrics, key, metrics)
+        return metrics
+
+    def sprite(self, word, font_size, orientation=None):
+        """Grey-scale rendering of ``word`` and its offset to the position.
+
+        Returns
+        -------
+        offset : tuple of int
+            (row, column) of the first sprite pixel relative to the position
+            the word is drawn at.
+
+        sprite : nd-array of uint8
+            Rendered word, 255 where the glyphs are fully opaque.
+        """
+        key = (word, font_size, orientation)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            font = self.font(font_size, orientation)
+            top, left, bottom, right = self.extent(word, font_size,
+                                                   orientation)
+            img = Image.new("L", (right - left, bottom - top))
+            ImageDraw.Draw(img).text((-left, -top), word, fill="white",
+                                     font=font)
+            sprite = (top, left), np.asarray(img)
+            self._n_pixels += sprite[1].size
+            if self._n_pixels > self.max_pixels:
+                self._sprites.clear()
+                self._n_pixels = sprite[1].size
+            self._sprites[key] = sprite
+        return sprite
+
+    def composite(self, img_array, word, font_size, orientation, position,
+                  color):
+        """Blend ``word`` in ``color`` into an RGB uint8 array.
+
+        Gives the same pixels as ``ImageDraw.text`` with ``fill=color`` at
+        position (row, column).
+        """
+        (off_x, off_y), sprite = self.sprite(word, font_size, orientation)
+        x, y = position[0] + off_x, position[1] + off_y
+        # clip sprite to the image
+        x_start, y_start = max(x, 0), max(y, 0)
+        x_end = min(x + sprite.shape[0], img_array.shape[0])
+        y_end = min(y + sprite.shape[1], img_array.shape[1])
+        if x_start >= x_end or y_start >= y_end:
+            return
+        region = img_array[x_start:x_end, y_start:y_end]
+        alpha = sprite[x_start - x:x_end - x, y_start - y:y_end - y,
+                       np.newaxis].astype(np.uint16)
+        # same rounding as Pillow's blending: (a * (255 - alpha) + b * alpha) / 255
+        blend = region * (255 - alpha) + np.asarray(color, np.uint16) * alpha
+        blend += 128
+        blend += blend >> 8
+        region[...] = blend >> 8
+
+    def paste(self, img_array, word, font_size, orientation, position):
+        """Draw ``word`` into a 2d uint8 array at position (row, column).
+
+        Returns
+        -------
+        covered : int
+            Number of pixels of ``img_array`` that were empty before and are
+            covered by the word now.
+        """
+        (off_x, off_y), sprite = self.sprite(word, font_size, orientation)
+        x, y = position[0] + off_x, position[1] + off_y
+        # clip sprite to the image
+        x_start, y_start = max(x, 0), max(y, 0)
+        x_end = min(x + sprite.shape[0], img_array.shape[0])
+        y_end = min(y + sprite.shape[1], img_array.shape[1])
+        if x_start >= x_end or y_start >= y_end:
+            return 0
+        region = img_array[x_start:x_end, y_start:y_end]
+        sprite = sprite[x_start - x:x_end - x, y_start - y:y_end - y]
+        covered = np.count_nonzero(region)
+        np.maximum(region, sprite, out=region)
+        return np.count_nonzero(region) - covered
+
+
+class _SVGWriter(object):
+    """Write SVG fragments to a text stream, separated by new lines."""
+    def __init__(self, file):
+        self.file = file
+        self.separator = ''
+
+    def append(self, fragment):
+        self.file.write(self.separator)
+        self.file.write(fragment)
+        self.separator = '\n'
+
+
 def random_color_func(word=None, font_size=None, position=None,
                       orientation=None, font_path=None, random_state=None):
     """Random hue color generation.
@@ -88,9 +370,32 @@ def random_color_func(word=None, font_size=None, position=None,
     return "hsl(%d, 80%%, 50%%)" % random_state.randint(0, 255)
 
 
+@lru_cache(maxsize=1)
+def _random_color_lut():
+    """RGB colors of the hues drawn by random_color_func."""
+    return np.array([ImageColor.getrgb("hsl(%d, 80%%, 50%%)" % hue)
+                     for hue in range(256)], dtype=np.uint8)
+
+
+def _random_color_batch(words, font_sizes, positions, orientations,
+                        random_state=None, **kwargs):
+    """Colors of random_color_func for many words at once."""
+    if random_state is None:
+        random_state = Random()
+    randint = random_state.randint
+    hues = [randint(0, 255) for _ in range(len(words))]
+    return _random_color_lut()[hues]
+
+
+random_color_func.batch = _random_color_batch
+
+
 class colormap_color_func(object):
     """Color func created from matplotlib colormap.
 
+    Colors are looked up in a table of the ``colormap.N`` (usually 256)
+    colors of the colormap.
+
     Parameters
     ----------
     colormap : string or matplotlib colormap
@@ -104,14 +409,39 @@ class colormap_color_func(object):
     def __init__(self, colormap):
         import matplotlib.pyplot as plt
         self.colormap = plt.get_cmap(colormap)
+        self._make_lut()
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if 'lut' not in state:
+            # pickled by an older version
+            self._make_lut()
+
+    def _make_lut(self):
+        colors = self.colormap(np.arange(self.colormap.N))[:, :3]
+        self.lut = np.rint(np.maximum(0, 255 * colors)).astype(np.uint8)
+        self._names = ["rgb(%d, %d, %d)" % tuple(color) for color in self.lut]
+
+    def _index(self, values):
+        # same color as self.colormap(values)
+        return np.minimum((np.asarray(values) * self.colormap.N).astype(int),
+                          self.colormap.N - 1)
 
     def __call__(self, word, font_size, position, orientation,
                  random_state=None, **kwargs):
         if random_state is None:
             random_state = Random()
-        r, g, b, _ = np.maximum(0, 255 * np.array(self.colormap(
-            random_state.uniform(0, 1))))
-        return "rgb({:.0f}, {:.0f}, {:.0f})".format(r, g, b)
+        return self._names[self._index(random_state.uniform(0, 1))]
+
+    def batch(self, words, font_sizes, positions, orientations,
+              random_state=None, **kwargs):
+        """Colors of many words at once, as an (n, 3) array of uint8."""
+        if random_state is None:
+            random_state = Random()
+        # same numbers as random_state.uniform(0, 1) for each word
+        draw = random_state.random
+        values = [draw() for _ in range(len(words))]
+        return self.lut[self._index(values)]
 
 
 def get_single_color_func(color):
@@ -119,6 +449,9 @@ def get_single_color_func(color):
     different values (HSV). Accepted values are color strings as usable by
     PIL/Pillow.
 
+    The returned function has a ``batch`` method to color many words at once,
+    see :func:`WordCloud.recolor`.
+
     >>> color_func1 = get_single_color_func('deepskyblue')
     >>> color_func2 = get_single_color_func('#00b4d2')
     """
@@ -148,9 +481,167 @@ def get_single_color_func(color):
         r, g, b = colorsys.hsv_to_rgb(h, s, random_state.uniform(0.2, 1))
         return 'rgb({:.0f}, {:.0f}, {:.0f})'.format(r * rgb_max, g * rgb_max,
                                                     b * rgb_max)
+
+    def batch(words, font_sizes, positions, orientations, random_state=None,
+              **kwargs):
+        """Colors of many words at once, as an (n, 3) array of uint8."""
+        if random_state is None:
+            random_state = Random()
+        # same numbers as random_state.uniform(0.2, 1) for each word
+        draw = random_state.random
+        values = 0.2 + (1 - 0.2) * np.array([draw() for _ in range(len(words))])
+        # colorsys.hsv_to_rgb with an array of values
+        if s == 0.0:
+            rgb = (values, values, values)
+        else:
+            i = int(h * 6.0)
+            f = (h * 6.0) - i
+            p = values * (1.0 - s)
+            q = values * (1.0 - s * f)
+            t = values * (1.0 - s * (1.0 - f))
+            rgb = [(values, t, p), (q, values, p), (p, values, t),
+                   (p, q, values), (t, p, values), (values, p, q)][i % 6]
+        return np.rint(np.stack(rgb, axis=-1) * rgb_max).astype(np.uint8)
+
+    single_color_func.batch = batch
     return single_color_func
 
 
+def _to_ink(color, mode):
+    """Color returned by a color function as stored in a layout.
+
+    Strings and tuples are parsed once into the integer ``ImageDraw`` uses
+    for the mode: packed RGBA, red in the lowest byte, for "RGB" and "RGBA"
+    images, the luminance for "L" images. Integers already are inks, and
+    colors for other modes are kept as they are.
+    """
+    if isinstance(color, (int, np.integer)) or mode not in ('RGB', 'RGBA', 'L'):
+        return color
+    try:
+        if not isinstance(color, str):
+            color = tuple(int(c) for c in color)
+        return _parse_ink(color, mode)
+    except (ValueError, TypeError):
+        # let ImageDraw deal with it
+        return color
+
+
+@lru_cache(maxsize=4096)
+def _parse_ink(color, mode):
+    if isinstance(color, str):
+        rgba = ImageColor.getcolor(color, 'RGBA')
+    elif len(color) in (3, 4):
+        rgba = color + (255,) * (4 - len(color))
+    else:
+        raise ValueError("Can't use color %r" % (color,))
+    r, g, b, a = rgba
+    if mode == 'L':
+        # same conversion as ImageColor.getcolor
+        return (r * 19595 + g * 38470 + b * 7471 + 0x8000) >> 16
+    return r | (g << 8) | (b << 16) | (a << 24)
+
+
+def _pack_colors(rgb, mode):
+    """Colors for a layout from an (n, 3) array, as ``ImageDraw`` inks.
+
+    RGB colors are packed in integers, red in the lowest byte and an opaque
+    alpha in the highest byte, gray-scale images get the luminance.
+    """
+    rgb = np.asarray(rgb, dtype=np.int64).reshape(-1, 3)
+    if mode in ('RGB', 'RGBA'):
+        packed = (rgb[:, 0] | (rgb[:, 1] << 8) | (rgb[:, 2] << 16)
+                  | (255 << 24))
+        return packed.tolist()
+    if mode == 'L':
+        # same conversion as ImageColor.getcolor
+        return (((rgb * [19595, 38470, 7471]).sum(axis=1) + 0x8000)
+                >> 16).tolist()
+    return ['#%02x%02x%02x' % tuple(color) for color in rgb]
+
+
+def top_frequencies(frequencies, max_words):
+    """Select the most frequent words, sorted by decreasing frequency.
+
+    Only the selected words are converted to Python objects, so large inputs
+    can be passed as arrays without building a list of all (word, frequency)
+    pairs. Ties keep their input order, as with a stable sort.
+
+    Parameters
+    ----------
+    frequencies : dict, pandas Series, pyarrow Table or tuple
+        Either a mapping from words to frequencies, a pandas Series of
+        frequencies indexed by words, a pyarrow Table whose first two columns
+        are words and frequencies, or a tuple ``(words, frequencies)`` of
+        sequences or arrays of the same length.
+
+    max_words : int
+        Number of words to select.
+
+    Returns
+    -------
+    frequencies : list of (string, float) tuples
+        The ``max_words`` most frequent words.
+
+    Raises
+    ------
+    ValueError
+        If frequencies given as arrays are not finite.
+    """
+    if hasattr(frequencies, 'column_names'):
+        # pyarrow Table
+        words = frequencies.column(0)
+        weights = frequencies.column(1).to_numpy()
+    elif isinstance(frequencies, tuple):
+        words, weights = frequencies
+        weights = np.asarray(weights)
+    elif hasattr(frequencies, 'index') and hasattr(frequencies, 'to_numpy'):
+        # pandas Series
+        words, weights = frequencies.index, frequencies.to_numpy()
+    else:
+        return heapq.nlargest(max_words, frequencies.items(),
+                              key=itemgetter(1))
+
+    if len(words) != len(weights):
+        raise ValueError("Got %d words but %d frequencies."
+                         % (len(words), len(weights)))
+    if weights.dtype.kind == 'f' and not np.isfinite(weights).all():
+        raise ValueError("Frequencies need to be finite, got %s."
+                         % weights[~np.isfinite(weights)][0])
+    if max_words <= 0:
+        return []
+    n_words = len(weights)
+    if max_words < n_words:
+        # k-th largest frequency, only ties with it need to be broken
+        threshold = np.partition(weights, n_words - max_words)[n_words - max_words]
+        selected = np.flatnonzero(weights > threshold)
+        ties = np.flatnonzero(weights == threshold)
+        selected = np.concatenate([selected, ties[:max_words - len(selected)]])
+    else:
+        selected = np.arange(n_words)
+    order = selected[np.lexsort((selected, -weights[selected]))]
+
+    if hasattr(words, 'to_pylist'):
+        words = words.take(order).to_pylist()
+    elif hasattr(words, 'take'):
+        words = words.take(order).tolist()
+    else:
+        words = [words[i] for i in order]
+    return list(zip(words, weights[order].tolist()))
+
+
+def _repetitions(frequencies, cycles):
+    """Repeat the words of sorted frequencies once per cycle, each time
+    down-weighted by the smallest frequency."""
+    downweight = frequencies[-1][1]
+    for i in cycles:
+        weight = downweight ** (i + 1)
+        if weight == 0:
+            # the repetitions would be skipped forever
+            return
+        for word, freq in frequencies:
+            yield word, freq * weight
+
+
 class WordCloud(object):
     r"""Word cloud object for generating and drawing.
 
@@ -179,6 +670,8 @@ class WordCloud(object):
         used instead. All white (#FF or #FFFFFF) entries will be considerd
         "masked out" while other entries will be free to draw on. [This
         changed in the most recent version!]
+        Use :func:`share_array` to pickle the word cloud (e.g. to send it to
+        worker processes) without copying the mask.
 
     contour_width: float (default=0)
         If mask is not None and contour_width > 0, draw the mask contour.
@@ -244,6 +737,17 @@ class WordCloud(object):
         If None is specified, ``r"\w[\w']+"`` is used. Ignored if using
         generate_from_frequencies.
 
+    tokenizer : callable or None (optional)
+        Function returning the list of tokens of a text, used instead of
+        ``regexp``, e.g. ``jieba.lcut`` to segment Chinese text. Whitespace
+        is stripped from the tokens and tokens that don't start with a match
+        of ``regexp`` (``r"\w"`` if None), such as punctuation, are dropped.
+        If the tokenizer has a ``batch`` method, it is called with lists of
+        parts of the text, cut at whitespace, and returns the list of tokens
+        of each part, to segment many parts at once. Texts are segmented in
+        parallel with ``n_jobs`` in ``process_text``, if the tokenizer can be
+        pickled. Ignored if using generate_from_frequencies.
+
     collocations : bool, default=True
         Whether to include collocations (bigrams) of two words. Ignored if using
         generate_from_frequencies.
@@ -266,7 +770,14 @@ class WordCloud(object):
 
     repeat : bool, default=False
         Whether to repeat words and phrases until max_words or min_font_size
-        is reached.
+        is reached, or until ``max_coverage`` is reached if it is given.
+
+    max_coverage : float or None, default=None
+        Stop adding words once this fraction of the free canvas area is
+        covered by text. With ``repeat=True``, words are repeated, beyond
+        ``max_words``, until this fraction is covered or no repetition fits
+        anymore; use 1 to fill the canvas. If None, there is no coverage
+        target.
 
     include_numbers : bool, default=False
         Whether to include numbers as phrases or not.
@@ -294,7 +805,11 @@ class WordCloud(object):
         Encodes the fitted word cloud. For each word, it encodes the string,
         normalized frequency, font size, position, orientation, and color.
         The frequencies are normalized by the most commonly occurring word.
-        The color is in the format of 'rgb(R, G, B).'
+        Colors returned by the color function are parsed once into the
+        integer Pillow draws with for the ``mode`` of the word cloud: the
+        packed RGBA value ``R + 256 * G + 65536 * B + 16777216 * A`` for "RGB"
+        and "RGBA", the gray level for "L". Call ``recolor`` after changing
+        ``mode``.
 
     Notes
     -----
@@ -314,7 +829,8 @@ class WordCloud(object):
                  relative_scaling='auto', regexp=None, collocations=True,
                  colormap=None, normalize_plurals=True, contour_width=0,
                  contour_color='black', repeat=False,
-                 include_numbers=False, min_word_length=0, collocation_threshold=30):
+                 include_numbers=False, min_word_length=0, collocation_threshold=30,
+                 max_coverage=None, tokenizer=None):
         if font_path is None:
             font_path = FONT_PATH
         if color_func is None and colormap is None:
@@ -340,6 +856,7 @@ class WordCloud(object):
         self.min_font_size = min_font_size
         self.font_step = font_step
         self.regexp = regexp
+        self.tokenizer = tokenizer
         if isinstance(random_state, int):
             random_state = Random(random_state)
         self.random_state = random_state
@@ -363,15 +880,46 @@ class WordCloud(object):
                           DeprecationWarning)
         self.normalize_plurals = normalize_plurals
         self.repeat = repeat
+        if max_coverage is not None and not 0 < max_coverage <= 1:
+            raise ValueError("max_coverage needs to be "
+                             "between 0 and 1, got %f." % max_coverage)
+        self.max_coverage = max_coverage
         self.include_numbers = include_numbers
         self.min_word_length = min_word_length
         self.collocation_threshold = collocation_threshold
+        self._canvas = None
+        self._glyphs = None
+        self._rendered = None
+        self._contour = None
+        self._pipeline = None
 
         # Override the width and height if there is a mask
         if mask is not None:
             self.width = mask.shape[1]
             self.height = mask.shape[0]
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # caches are rebuilt when needed
+        state['_canvas'] = None
+        state['_glyphs'] = None
+        state['_rendered'] = None
+        state['_contour'] = None
+        state['_pipeline'] = None
+        return state
+
+    def __setstate__(self, state):
+        # attributes missing from word clouds pickled by older versions
+        self.__dict__.update(max_coverage=None, tokenizer=None, _canvas=None,
+                             _glyphs=None, _rendered=None, _contour=None,
+                             _pipeline=None)
+        self.__dict__.update(state)
+        layout = getattr(self, 'layout_', None)
+        if layout and not isinstance(layout[0][-1], (int, np.integer)):
+            # colors were stored as strings
+            self.layout_ = [item[:-1] + (_to_ink(item[-1], self.mode),)
+                            for item in layout]
+
     def fit_words(self, frequencies):
         """Create a word_cloud from words and frequencies.
 
@@ -379,8 +927,9 @@ class WordCloud(object):
 
         Parameters
         ----------
-        frequencies : dict from string to float
-            A contains words and associated frequency.
+        frequencies : dict from string to float, or arrays
+            A contains words and associated frequency. See
+            generate_from_frequencies for the accepted array inputs.
 
         Returns
         -------
@@ -393,8 +942,12 @@ class WordCloud(object):
 
         Parameters
         ----------
-        frequencies : dict from string to float
-            A contains words and associated frequency.
+        frequencies : dict from string to float, or arrays
+            A contains words and associated frequency. Large inputs can also
+            be given as a pandas Series indexed by words, a pyarrow Table
+            with words and frequencies as first two columns, or a tuple
+            ``(words, frequencies)`` of arrays; only the ``max_words`` most
+            frequent words are then converted to Python objects.
 
         max_font_size : int
             Use this font-size instead of self.max_font_size
@@ -405,11 +958,10 @@ class WordCloud(object):
 
         """
         # make sure frequencies are sorted and normalized
-        frequencies = sorted(frequencies.items(), key=itemgetter(1), reverse=True)
+        frequencies = top_frequencies(frequencies, self.max_words)
         if len(frequencies) <= 0:
             raise ValueError("We need at least 1 word to plot a word cloud, "
                              "got %d." % len(frequencies))
-        frequencies = frequencies[:self.max_words]
 
         # largest entry will be 1
         max_frequency = float(frequencies[0][1])
@@ -422,20 +974,19 @@ class WordCloud(object):
         else:
             random_state = Random()
 
-        if self.mask is not None:
-            boolean_mask = self._get_bolean_mask(self.mask)
-            width = self.mask.shape[1]
-            height = self.mask.shape[0]
-        else:
-            boolean_mask = None
-            height, width = self.height, self.width
-        occupancy = IntegralOccupancyMap(height, width, boolean_mask)
+        boolean_mask, occupancy = self._new_canvas()
+        height, width = occupancy.height, occupancy.width
+        glyphs = self._get_glyphs()
 
-        # create image
-        img_grey = Image.new("L", (width, height))
-        draw = ImageDraw.Draw(img_grey)
-        img_array = np.asarray(img_grey)
-        font_sizes, positions, orientations, colors = [], [], [], []
+        # grey image of everything drawn so far, masked out areas included
+        if boolean_mask is None:
+            img_array = np.zeros((height, width), dtype=np.uint8)
+            free_area = height * width
+        else:
+            img_array = boolean_mask.astype(np.uint8)
+            free_area = height * width - np.count_nonzero(boolean_mask)
+        covered = 0
+        placed, font_sizes, positions, orientations, colors = [], [], [], [], []
 
         last_freq = 1.
 
@@ -474,94 +1025,287 @@ class WordCloud(object):
         # above... hurray for good design?
         self.words_ = dict(frequencies)
 
-        if self.repeat and len(frequencies) < self.max_words:
-            # pad frequencies with repeating words.
-            times_extend = int(np.ceil(self.max_words / len(frequencies))) - 1
-            # get smallest frequency
-            frequencies_org = list(frequencies)
-            downweight = frequencies[-1][1]
-            for i in range(times_extend):
-                frequencies.extend([(word, freq * downweight ** (i + 1))
-                                    for word, freq in frequencies_org])
+        layout_frequencies = frequencies
+        if self.max_coverage is None:
+            max_covered = free_area + 1
+        else:
+            max_covered = self.max_coverage * free_area
+        if self.repeat and (len(frequencies) < self.max_words
+                            or self.max_coverage is not None):
+            # fill the gaps with repeating words. The repetitions are
+            # generated lazily, and as the same words come back at the same
+            # font sizes they are drawn from the glyph cache.
+            if self.max_coverage is None:
+                n_times = int(np.ceil(self.max_words / len(frequencies))) - 1
+                cycles = range(n_times)
+            else:
+                # until the coverage target is reached or nothing fits
+                cycles = itertools.count()
+            layout_frequencies = chain(
+                frequencies, _repetitions(frequencies, cycles))
 
         # start drawing grey image
-        for word, freq in frequencies:
+        for word, freq in layout_frequencies:
             if freq == 0:
                 continue
+            if covered >= max_covered:
+                break
             # select the font size
             rs = self.relative_scaling
             if rs != 0:
                 font_size = int(round((rs * (freq / float(last_freq))
                                        + (1 - rs)) * font_size))
-            if random_state.random() < self.prefer_horizontal:
-                orientation = None
-            else:
-                orientation = Image.ROTATE_90
-            tried_other_orientation = False
-            while True:
-                if font_size < self.min_font_size:
-                    # font-size went too small
-                    break
-                # try to find a position
-                font = ImageFont.truetype(self.font_path, font_size)
-                # transpose font optionally
-                transposed_font = ImageFont.TransposedFont(
-                    font, orientation=orientation)
-                # get size of resulting text
-                box_size = draw.textbbox((0, 0), word, font=transposed_font, anchor="lt")
-                # find possible places using integral image:
-                result = occupancy.sample_position(box_size[3] + self.margin,
-                                                   box_size[2] + self.margin,
-                                                   random_state)
-                if result is not None:
-                    # Found a place
-                    break
-                # if we didn't find a place, make font smaller
-                # but first try to rotate!
-                if not tried_other_orientation and self.prefer_horizontal < 1:
-                    orientation = (Image.ROTATE_90 if orientation is None else
-                                   Image.ROTATE_90)
-                    tried_other_orientation = True
-                else:
-                    font_size -= self.font_step
-                    orientation = None
+            font_size, orientation, result = self._find_position(
+                word, font_size, occupancy, glyphs, random_state)
 
-            if font_size < self.min_font_size:
+            if result is None:
                 # we were unable to draw any more
                 break
 
             x, y = np.array(result) + self.margin // 2
             # actually draw the text
-            draw.text((y, x), word, fill="white", font=transposed_font)
+            covered += glyphs.paste(img_array, word, font_size, orientation,
+                                    (x, y))
+            placed.append((word, freq))
             positions.append((x, y))
             orientations.append(orientation)
             font_sizes.append(font_size)
-            colors.append(self.color_func(word, font_size=font_size,
-                                          position=(x, y),
-                                          orientation=orientation,
-                                          random_state=random_state,
-                                          font_path=self.font_path))
-            # recompute integral image
-            if self.mask is None:
-                img_array = np.asarray(img_grey)
-            else:
-                img_array = np.asarray(img_grey) + boolean_mask
+            color = self.color_func(word, font_size=font_size,
+                                    position=(x, y), orientation=orientation,
+                                    random_state=random_state,
+                                    font_path=self.font_path,
+                                    **self._box_kwargs(self.color_func,
+                                                       glyphs, word,
+                                                       font_size, orientation))
+            colors.append(_to_ink(color, self.mode))
             # recompute bottom right
             # the order of the cumsum's is important for speed ?!
             occupancy.update(img_array, x, y)
             last_freq = freq
 
-        self.layout_ = list(zip(frequencies, font_sizes, positions,
+        self.layout_ = list(zip(placed, font_sizes, positions,
                                 orientations, colors))
         return self
 
-    def process_text(self, text):
+    def generate_per_group(self, X, vocabulary, groups=None):
+        """Generate one word cloud per group of rows of a term count matrix.
+
+        Term counts are summed over the rows of each group in a single sparse
+        matrix product. The mask, its occupancy map and the rendered glyphs
+        are shared by all clouds.
+
+        Parameters
+        ----------
+        X : scipy sparse matrix or nd-array, shape (n_documents, n_terms)
+            Term counts or weights, as returned by a vectorizer.
+
+        vocabulary : array-like, shape (n_terms,)
+            The term of each column of ``X``, for example
+            ``vectorizer.get_feature_names_out()``.
+
+        groups : array-like, shape (n_documents,) or None (default=None)
+            Group label of each row of ``X``. If None, all rows form a single
+            group.
+
+        Yields
+        ------
+        group : object
+            Group label, in sorted order.
+
+        self or None
+            The word cloud generated for this group. It is regenerated for the
+            next group, so export it before advancing the iteration. None if
+            all the term counts of the group are zero, e.g. for documents
+            whose terms were all removed by the vectorizer.
+        """
+        # Import here, to avoid hard dependency on scipy
+        import scipy.sparse
+
+        n_documents = X.shape[0]
+        if groups is None:
+            groups = np.zeros(n_documents, dtype=int)
+        groups = np.asarray(groups)
+        if groups.shape != (n_documents,):
+            raise ValueError("Got %d group labels for a matrix with %d rows."
+                             % (len(groups), n_documents))
+        if len(vocabulary) != X.shape[1]:
+            raise ValueError("Got %d terms in vocabulary for a matrix with %d"
+                             " columns." % (len(vocabulary), X.shape[1]))
+        labels, group_index = np.unique(groups, return_inverse=True)
+        indicator = scipy.sparse.csr_matrix(
+            (np.ones(n_documents), (group_index, np.arange(n_documents))),
+            shape=(len(labels), n_documents))
+        sums = indicator @ X
+        if scipy.sparse.issparse(sums):
+            sums = scipy.sparse.csr_matrix(sums)
+            sums.sum_duplicates()
+        else:
+            # rows of a np.matrix would be 2d
+            sums = np.asarray(sums)
+
+        self._canvas = self._new_canvas()
+        try:
+            for i, label in enumerate(labels):
+                if scipy.sparse.issparse(sums):
+                    row = slice(sums.indptr[i], sums.indptr[i + 1])
+                    terms, weights = sums.indices[row], sums.data[row]
+                else:
+                    terms = np.flatnonzero(sums[i])
+                    weights = sums[i][terms]
+                if not np.any(weights):
+                    # empty group, there is nothing to draw
+                    yield label, None
+                    continue
+                frequencies = top_frequencies((terms, weights), self.max_words)
+                self.generate_from_frequencies(
+                    {str(vocabulary[term]): weight for term, weight in frequencies})
+                yield label, self
+        finally:
+            self._canvas = None
+
+    def _new_canvas(self):
+        """Boolean mask and empty occupancy map for a layout."""
+        if self._canvas is not None:
+            # reuse the templates while generating several clouds
+            boolean_mask, occupancy = self._canvas
+            return boolean_mask, occupancy.copy()
+        if self.mask is not None:
+            boolean_mask = self._get_bolean_mask(self.mask)
+            width = self.mask.shape[1]
+            height = self.mask.shape[0]
+        else:
+            boolean_mask = None
+            height, width = self.height, self.width
+        occupancy = IntegralOccupancyMap(height, width, boolean_mask)
+        return boolean_mask, occupancy
+
+    def _get_glyphs(self):
+        """Glyph cache of the font, kept for placing and drawing words."""
+        if self._glyphs is None or self._glyphs.font_path != self.font_path:
+            self._glyphs = GlyphCache(self.font_path)
+        return self._glyphs
+
+    def _find_position(self, word, font_size, occupancy, glyphs, random_state):
+        """Find room for a word, rotating it or shrinking the font if needed.
+
+        Returns
+        -------
+        font_size : int
+            Font size the word fits with.
+
+        orientation : int or None
+            Orientation the word fits with.
+
+        position : tuple of int or None
+            Free position found, None if the word doesn't fit even at
+            ``min_font_size``.
+        """
+        if random_state.random() < self.prefer_horizontal:
+            orientation = None
+        else:
+            orientation = Image.ROTATE_90
+        tried_other_orientation = False
+        while font_size >= self.min_font_size:
+            # get size of resulting text
+            box_size = glyphs.box(word, font_size, orientation)
+            # find possible places using integral image:
+            result = occupancy.sample_position(box_size[3] + self.margin,
+                                               box_size[2] + self.margin,
+                                               random_state)
+            if result is not None:
+                # Found a place
+                return font_size, orientation, result
+            # if we didn't find a place, make font smaller
+            # but first try to rotate!
+            if not tried_other_orientation and self.prefer_horizontal < 1:
+                orientation = (Image.ROTATE_90 if orientation is None else
+                               Image.ROTATE_90)
+                tried_other_orientation = True
+            else:
+                font_size -= self.font_step
+                orientation = None
+        return font_size, orientation, None
+
+    def count_words(self, text, counts=None, n_jobs=1):
+        """Count the words and bigrams of a text, eliminating the stopwords.
+
+        Parts of a text can be counted separately and merged, see
+        :class:`wordcloud.WordCounts`.
+
+        Parameters
+        ----------
+        text : string, file object or iterable of strings
+            The text to be counted. Files and iterables are tokenized chunk
+            by chunk and the counts are updated incrementally, so memory
+            depends on the vocabulary, not on the length of the text. Chunks
+            are split at whitespace, see
+            :func:`wordcloud.tokenization.tokenize_chunks`.
+
+        counts : counts or None (default=None)
+            Counts of the preceding text to add to. If None, new counts are
+            returned. Use :class:`wordcloud.HeavyHitters` to count texts
+            with an unbounded vocabulary in bounded memory, and
+            :class:`wordcloud.WindowedCounts` to count the most recent text
+            of a stream.
+
+        n_jobs : int or None (default=1)
+            Number of worker processes counting parts of the text, split at
+            whitespace, in parallel. If None, the number of CPUs is used. The
+            counts are the same for any number of processes, as long as
+            ``regexp`` doesn't match whitespace.
+
+        Returns
+        -------
+        counts : WordCounts, HeavyHitters or WindowedCounts
+        """
+        if n_jobs != 1:
+            # Import here, to avoid a circular import
+            from .parallel import count_words
+
+            return count_words(self, text, counts, n_jobs=n_jobs)
+
+        return self.text_pipeline().count(text, counts)
+
+    def text_pipeline(self):
+        """Tokenizer and counter of texts with the settings of the word cloud.
+
+        The pipeline is built once and reused until a setting (stopwords,
+        regexp, ...) changes. To process many texts, possibly in many
+        threads, get the pipeline once and call its ``process`` method.
+
+        Returns
+        -------
+        pipeline : TextPipeline
+        """
+        settings = (self.regexp, self.min_word_length, self.include_numbers,
+                    self.collocations, self.normalize_plurals,
+                    self.collocation_threshold, self.tokenizer)
+        stopwords = self.stopwords
+        if not isinstance(stopwords, (set, frozenset)):
+            stopwords = frozenset(stopwords)
+        pipeline = self._pipeline
+        # the stopwords are copied, as they may be modified in place
+        if (pipeline is None or pipeline[0] != settings
+                or pipeline[1] != stopwords):
+            pipeline = self._pipeline = (
+                settings, frozenset(stopwords),
+                TextPipeline(stopwords, *settings))
+        return pipeline[2]
+
+    def process_text(self, text, n_jobs=1):
         """Splits a long text into words, eliminates the stopwords.
 
         Parameters
         ----------
-        text : string
-            The text to be processed.
+        text : string, file object, iterable of strings or counts
+            The text to be processed, see :func:`WordCloud.count_words`, or
+            its counts (WordCounts, HeavyHitters or WindowedCounts). Cases,
+            plurals and collocations are resolved on the counts of the whole
+            text.
+
+        n_jobs : int or None (default=1)
+            Number of worker processes tokenizing the text, see
+            :func:`WordCloud.count_words`.
 
         Returns
         -------
@@ -576,32 +1320,11 @@ class WordCloud(object):
         There are better ways to do word tokenization, but I don't want to
         include all those things.
         """
-
-        flags = (re.UNICODE if sys.version < '3' and type(text) is unicode  # noqa: F821
-                 else 0)
-        pattern = r"\w[\w']*" if self.min_word_length <= 1 else r"\w[\w']+"
-        regexp = self.regexp if self.regexp is not None else pattern
-
-        words = re.findall(regexp, text, flags)
-        # remove 's
-        words = [word[:-2] if word.lower().endswith("'s") else word
-                 for word in words]
-        # remove numbers
-        if not self.include_numbers:
-            words = [word for word in words if not word.isdigit()]
-        # remove short words
-        if self.min_word_length:
-            words = [word for word in words if len(word) >= self.min_word_length]
-
-        stopwords = set([i.lower() for i in self.stopwords])
-        if self.collocations:
-            word_counts = unigrams_and_bigrams(words, stopwords, self.normalize_plurals, self.collocation_threshold)
-        else:
-            # remove stopwords
-            words = [word for word in words if word.lower() not in stopwords]
-            word_counts, _ = process_tokens(words, self.normalize_plurals)
-
-        return word_counts
+        if (isinstance(text, (WordCounts, HeavyHitters, WindowedCounts))
+                or n_jobs == 1):
+            return self.text_pipeline().process(text)
+        return self.text_pipeline().process(self.count_words(text,
+                                                             n_jobs=n_jobs))
 
     def generate_from_text(self, text):
         """Generate wordcloud from text.
@@ -648,27 +1371,125 @@ class WordCloud(object):
                              " first.")
 
     def to_image(self):
+        return self._get_rendered()[0].copy()
+
+    def _get_rendered(self):
+        """Rendered image and its array, cached until the cloud changes.
+
+        The cache is invalidated when ``layout_`` is replaced (``generate``,
+        ``recolor``, ...) or modified, when ``mask`` is replaced or modified,
+        or when a drawing parameter or the size changes.
+        """
         self._check_generated()
+        try:
+            # detects changes of layout_ in place
+            layout = (len(self.layout_), hash(tuple(self.layout_)))
+        except TypeError:
+            # unhashable colors, never cached
+            layout = object()
+        params = (self.mode, self.background_color, self.scale,
+                  self.font_path, self.contour_width, self.contour_color,
+                  self.width, self.height, layout, self._mask_key())
+        rendered = self._rendered
+        if (rendered is None or rendered[2] is not self.layout_
+                or rendered[3] != params):
+            width, height = self._image_size()
+            img = self._render_region((0, 0, height, width))
+            # read-only, callers get copies
+            array = np.asarray(img)
+            rendered = self._rendered = (img, array, self.layout_, params)
+        return rendered[:2]
+
+    def _mask_key(self):
+        """Checksum of the mask, to detect changes of the mask in place."""
+        if self.mask is None:
+            return None
+        mask = np.ascontiguousarray(self.mask)
+        return mask.shape, mask.dtype.str, zlib.crc32(mask)
+
+    def _image_size(self):
+        """Width and height of the rendered image in pixels."""
         if self.mask is not None:
             width = self.mask.shape[1]
             height = self.mask.shape[0]
         else:
             height, width = self.height, self.width
+        return int(width * self.scale), int(height * self.scale)
 
-        img = Image.new(self.mode, (int(width * self.scale),
-                                    int(height * self.scale)),
-                        self.background_color)
-        draw = ImageDraw.Draw(img)
-        for (word, count), font_size, position, orientation, color in self.layout_:
-            font = ImageFont.truetype(self.font_path,
-                                      int(font_size * self.scale))
-            transposed_font = ImageFont.TransposedFont(
-                font, orientation=orientation)
-            pos = (int(position[1] * self.scale),
-                   int(position[0] * self.scale))
-            draw.text(pos, word, fill=color, font=transposed_font)
+    def _render_region(self, region):
+        """Render the pixels (top, left, bottom, right) of the image.
 
-        return self._draw_contour(img=img)
+        Rendering the image region by region gives the same words as
+        rendering it at once, only the words overlapping the region are
+        drawn. The contour is resampled for the region only, which can round
+        a few of its edge pixels differently.
+        """
+        top, left, bottom, right = region
+        glyphs = self._get_glyphs()
+        words = []
+        for (word, count), font_size, position, orientation, color in self.layout_:
+            font_size = int(font_size * self.scale)
+            pos = (int(position[0] * self.scale) - top,
+                   int(position[1] * self.scale) - left)
+            extent = glyphs.extent(word, font_size, orientation)
+            if (pos[0] + extent[2] > 0 and pos[0] + extent[0] < bottom - top
+                    and pos[1] + extent[3] > 0
+                    and pos[1] + extent[1] < right - left):
+                words.append((word, font_size, pos, orientation, color))
+
+        contour = self._get_contour(region)
+        if self.mode == "RGB":
+            # blend the cached word sprites, no text is laid out again
+            img_array = np.zeros((bottom - top, right - left, 3),
+                                 dtype=np.uint8)
+            if self.background_color is not None:
+                img_array[...] = self._getcolor(self.background_color, "RGB")
+            colors = {}
+            for word, font_size, pos, orientation, color in words:
+                key = repr(color)
+                if key not in colors:
+                    colors[key] = self._getcolor(color, self.mode)
+                glyphs.composite(img_array, word, font_size, orientation, pos,
+                                 colors[key])
+        else:
+            img = Image.new(self.mode, (right - left, bottom - top),
+                            self.background_color)
+            draw = ImageDraw.Draw(img)
+            for word, font_size, pos, orientation, color in words:
+                font = glyphs.font(font_size, orientation)
+                draw.text((pos[1], pos[0]), word, fill=color, font=font)
+            if contour is None:
+                return img
+            img_array = np.array(img)
+
+        if contour is not None:
+            # color the contour pixels in place
+            color = ImageColor.getcolor(self.contour_color, self.mode)
+            img_array.reshape((-1,) + img_array.shape[2:])[contour] = color
+        return Image.fromarray(img_array)
+
+    @staticmethod
+    def _getcolor(color, mode):
+        """Color as a tuple, from any color accepted by ``ImageDraw``."""
+        if isinstance(color, str):
+            return ImageColor.getcolor(color, mode)
+        if isinstance(color, (int, np.integer)):
+            # packed integer, red in the lowest byte
+            return (color & 255, (color >> 8) & 255, (color >> 16) & 255)
+        return tuple(color)[:len(mode)]
+
+    def _css_color(self, color):
+        """CSS color of a layout color."""
+        if isinstance(color, str):
+            return color
+        if isinstance(color, (int, np.integer)):
+            if self.mode == 'L':
+                return "rgb(%d, %d, %d)" % ((color,) * 3)
+            alpha = (color >> 24) & 255
+            if self.mode == 'RGBA' and alpha != 255:
+                return "rgba(%d, %d, %d, %.3g)" % (
+                    self._getcolor(color, 'RGB') + (alpha / 255.,))
+        return "rgb(%d, %d, %d)" % self._getcolor(color, 'RGB')
 
     def recolor(self, random_state=None, color_func=None, colormap=None):
         """Recolor existing layout.
@@ -676,6 +1497,16 @@ class WordCloud(object):
         Applying a new coloring is much faster than generating the whole
         wordcloud.
 
+        Color functions with a ``batch`` method, like the built-in ones, color
+        all words with one call::
+
+            color_func.batch(words, font_sizes, positions, orientations,
+                             random_state=random_state, font_path=font_path)
+
+        where ``words`` and ``orientations`` are lists, ``font_sizes`` is an
+        array of shape (n,) and ``positions`` an array of shape (n, 2). It
+        returns the colors as an array of shape (n, 3) of uint8.
+
         Parameters
         ----------
         random_state : RandomState, int, or None, default=None
@@ -703,43 +1534,191 @@ class WordCloud(object):
                 color_func = self.color_func
             else:
                 color_func = colormap_color_func(colormap)
+        glyphs = self._get_glyphs()
+        if hasattr(color_func, 'batch'):
+            if not self.layout_:
+                return self
+            word_freqs, font_sizes, positions, orientations, _ = zip(
+                *self.layout_)
+            colors = self._batch_colors(color_func, glyphs, random_state,
+                                        word_freqs, font_sizes, positions,
+                                        orientations)
+            self.layout_ = list(zip(word_freqs, font_sizes, positions,
+                                    orientations, colors))
+            return self
         self.layout_ = [(word_freq, font_size, position, orientation,
-                         color_func(word=word_freq[0], font_size=font_size,
-                                    position=position, orientation=orientation,
-                                    random_state=random_state,
-                                    font_path=self.font_path))
+                         _to_ink(color_func(word=word_freq[0],
+                                            font_size=font_size,
+                                            position=position,
+                                            orientation=orientation,
+                                            random_state=random_state,
+                                            font_path=self.font_path,
+                                            **self._box_kwargs(
+                                                color_func, glyphs,
+                                                word_freq[0], font_size,
+                                                orientation)),
+                                 self.mode))
                         for word_freq, font_size, position, orientation, _
                         in self.layout_]
         return self
 
-    def to_file(self, filename):
+    def _batch_colors(self, color_func, glyphs, random_state, word_freqs,
+                      font_sizes, positions, orientations):
+        """Colors of words of the layout with ``color_func.batch``."""
+        words = [word for word, _ in word_freqs]
+        orientations = list(orientations)
+        kwargs = {}
+        if isinstance(color_func, ImageColorGenerator):
+            # reuse the boxes computed for the layout
+            kwargs['box_sizes'] = np.array(
+                [glyphs.box(word, font_size, orientation) for word, font_size,
+                 orientation in zip(words, font_sizes, orientations)],
+                dtype=int).reshape(-1, 4)
+        rgb = color_func.batch(words, np.array(font_sizes, dtype=int),
+                               np.array(positions, dtype=int).reshape(-1, 2),
+                               orientations, random_state=random_state,
+                               font_path=self.font_path, **kwargs)
+        return _pack_colors(rgb, self.mode)
+
+    @staticmethod
+    def _box_kwargs(color_func, glyphs, word, font_size, orientation):
+        """Box of a placed word for color functions that use it."""
+        if isinstance(color_func, ImageColorGenerator):
+            # reuse the box computed for the layout
+            return {'box_size': glyphs.box(word, font_size, orientation)}
+        return {}
+
+    def to_file(self, filename, format=None, optimize=None,
+                compress_level=None, quality=None, lossless=False,
+                band_height=None):
         """Export to image file.
 
         Parameters
         ----------
-        filename : string
-            Location to write to.
+        filename : string or file object
+            Location to write to, or binary file object (e.g. ``BytesIO``)
+            to write the encoded image to.
+
+        format : string or None (default=None)
+            Image format, e.g. "png", "jpeg" or "webp". If None, it is
+            determined from the file name, and PNG is used for file objects
+            without a name.
+
+        optimize : bool or None (default=None)
+            Spend more time to make the file smaller. If None, PNG files are
+            optimized unless ``compress_level`` is given, JPEG files aren't
+            and WebP files use the encoder's default effort. Turning it off
+            is much faster for large PNG images.
+
+        compress_level : int or None (default=None)
+            zlib compression level of PNG files, from 0 (fastest) to 9
+            (smallest). Ignored if ``optimize`` is True.
+
+        quality : int or None (default=None)
+            Quality of JPEG and lossy WebP files, from 0 to 100. The
+            encoder's default is used if None.
+
+        lossless : bool (default=False)
+            Write lossless WebP files.
+
+        band_height : int or None (default=None)
+            If not None, a PNG file is rendered and written in bands of this
+            many rows, so the full image is never in memory. Use this for
+            large images (high ``scale``). The mask contour can differ in a
+            few pixels at its edge.
 
         Returns
         -------
         self
         """
+        if format is None:
+            format = self._image_format(filename)
+        format = format.upper()
+        if band_height is not None:
+            if format != 'PNG':
+                raise ValueError("Only PNG files can be written band by band,"
+                                 " got %s." % format)
+            # Import here, to avoid a circular import
+            from .png import write_png
+            write_png(self, filename, band_height=band_height,
+                      compress_level=(6 if compress_level is None
+                                      else compress_level))
+            return self
+
+        options = {}
+        if format == 'PNG':
+            if compress_level is not None:
+                options['compress_level'] = compress_level
+            options['optimize'] = (compress_level is None if optimize is None
+                                   else optimize)
+        elif format in ('JPEG', 'WEBP'):
+            if quality is not None:
+                options['quality'] = quality
+            if format == 'WEBP':
+                options['lossless'] = lossless
+                if optimize is not None:
+                    # encoding effort, from 0 (fastest) to 6
+                    options['method'] = 6 if optimize else 0
+            else:
+                options['optimize'] = bool(optimize)
+        else:
+            options['optimize'] = optimize is None or optimize
 
-        img = self.to_image()
-        img.save(filename, optimize=True)
+        img = self._get_rendered()[0]
+        img.save(filename, format=format, **options)
         return self
 
+    def to_bytes(self, format='png', **kwargs):
+        """Encode the image to bytes.
+
+        Parameters
+        ----------
+        format : string (default='png')
+            Image format, e.g. "png", "jpeg" or "webp".
+
+        kwargs
+            Encoding options ``optimize``, ``compress_level``, ``quality``
+            and ``lossless``, see :func:`WordCloud.to_file`.
+
+        Returns
+        -------
+        data : bytes
+            Encoded image.
+        """
+        buffer = io.BytesIO()
+        self.to_file(buffer, format=format, **kwargs)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _image_format(filename):
+        """Image format for a file name, PNG for file objects without one."""
+        is_file = hasattr(filename, 'write')
+        name = getattr(filename, 'name', None) if is_file else filename
+        if is_file and not isinstance(name, str):
+            return 'PNG'
+        extension = os.path.splitext(os.fspath(name))[1].lower()
+        extensions = Image.registered_extensions()
+        if extension in extensions:
+            return extensions[extension]
+        if is_file:
+            # e.g. stdout
+            return 'PNG'
+        raise ValueError("Unknown image file extension: %s" % name)
+
     def to_array(self):
         """Convert to numpy array.
 
+        The image is rendered once and cached until the word cloud changes;
+        each call returns a new copy of it.
+
         Returns
         -------
         image : nd-array size (width, height, 3)
             Word cloud image as numpy matrix.
         """
-        return np.array(self.to_image())
+        return self._get_rendered()[1].copy()
 
-    def __array__(self):
+    def __array__(self, dtype=None, copy=None):
         """Convert to numpy array.
 
         Returns
@@ -747,9 +1726,15 @@ class WordCloud(object):
         image : nd-array size (width, height, 3)
             Word cloud image as numpy matrix.
         """
-        return self.to_array()
-
-    def to_svg(self, embed_font=False, optimize_embedded_font=True, embed_image=False):
+        array = self._get_rendered()[1]
+        if dtype is not None and dtype != array.dtype:
+            return array.astype(dtype)
+        if copy is False:
+            # the cached image, read-only
+            return array
+        return array.copy()
+
+    def to_svg(self, embed_font=False, optimize_embedded_font=True, embed_image=False, file=None):
         """Export to SVG.
 
         Font is assumed to be available to the SVG reader. Otherwise, text
@@ -776,8 +1761,13 @@ class WordCloud(object):
 
         Parameters
         ----------
-        embed_font : bool, default=False
-            Whether to include font inside resulting SVG file.
+        embed_font : bool or string, default=False
+            Whether to include font inside resulting SVG file. A subset of
+            the font with the characters of the layout is embedded; subsets
+            are cached and reused by all word clouds with the same font and
+            characters. If a string, the path of a WOFF or WOFF2 file to embed
+            as is instead, e.g. the full font converted once beforehand, for
+            large character sets that are slow to subset.
 
         optimize_embedded_font : bool, default=True
             Whether to be aggressive when embedding a font, to reduce size. In
@@ -788,10 +1778,14 @@ class WordCloud(object):
             Whether to include rasterized image inside resulting SVG file.
             Useful for debugging.
 
+        file : writable text stream or None, default=None
+            If given, the SVG is written to this stream as it is generated,
+            word by word, instead of being returned as a string.
+
         Returns
         -------
-        content : string
-            Word cloud image as SVG string
+        content : string or None
+            Word cloud image as SVG string, None if ``file`` is given.
         """
 
         # TODO should add option to specify URL for font (i.e. WOFF file)
@@ -813,10 +1807,16 @@ class WordCloud(object):
             max_font_size = self.max_font_size
 
         # Text buffer
-        result = []
+        if file is None:
+            buffer = io.StringIO()
+            self.to_svg(embed_font=embed_font,
+                        optimize_embedded_font=optimize_embedded_font,
+                        embed_image=embed_image, file=buffer)
+            return buffer.getvalue()
+        result = _SVGWriter(file)
 
         # Get font information
-        font = ImageFont.truetype(self.font_path, int(max_font_size * self.scale))
+        font = _truetype(self.font_path, int(max_font_size * self.scale))
         raw_font_family, raw_font_style = font.getname()
         # TODO properly escape/quote this name?
         font_family = repr(raw_font_family)
@@ -848,59 +1848,32 @@ class WordCloud(object):
 
         # Embed font, if requested
         if embed_font:
-
-            # Import here, to avoid hard dependency on fonttools
-            import fontTools
-            import fontTools.subset
-
-            # Subset options
-            options = fontTools.subset.Options(
-
-                # Small impact on character shapes, but reduce size a lot
-                hinting=not optimize_embedded_font,
-
-                # On small subsets, can improve size
-                desubroutinize=optimize_embedded_font,
-
-                # Try to be lenient
-                ignore_missing_glyphs=True,
-            )
-
-            # Load and subset font
-            ttf = fontTools.subset.load_font(self.font_path, options)
-            subsetter = fontTools.subset.Subsetter(options)
-            characters = {c for item in self.layout_ for c in item[0][0]}
-            text = ''.join(characters)
-            subsetter.populate(text=text)
-            subsetter.subset(ttf)
-
-            # Export as WOFF
-            # TODO is there a better method, i.e. directly export to WOFF?
-            buffer = io.BytesIO()
-            ttf.saveXML(buffer)
-            buffer.seek(0)
-            woff = fontTools.ttLib.TTFont(flavor='woff')
-            woff.importXML(buffer)
+            if isinstance(embed_font, str):
+                url = _font_url(embed_font)
+                font_format = 'woff2' if url.startswith(
+                    'data:application/font-woff2') else 'woff'
+            else:
+                characters = {c for item in self.layout_ for c in item[0][0]}
+                url = _subset_font_url(self.font_path, ''.join(sorted(characters)),
+                                       optimize_embedded_font)
+                font_format = 'woff'
 
             # Create stylesheet with embedded font face
-            buffer = io.BytesIO()
-            woff.save(buffer)
-            data = base64.b64encode(buffer.getbuffer()).decode('ascii')
-            url = 'data:application/font-woff;charset=utf-8;base64,' + data
             result.append(
                 '<style>'
                 '@font-face{{'
                 'font-family:{};'
                 'font-weight:{};'
                 'font-style:{};'
-                'src:url("{}")format("woff");'
+                'src:url("{}")format("{}");'
                 '}}'
                 '</style>'
                 .format(
                     font_family,
                     font_weight,
                     font_style,
-                    url
+                    url,
+                    font_format
                 )
             )
 
@@ -934,7 +1907,7 @@ class WordCloud(object):
 
         # Embed image, useful for debug purpose
         if embed_image:
-            image = self.to_image()
+            image = self._get_rendered()[0]
             data = io.BytesIO()
             image.save(data, format='JPEG')
             data = base64.b64encode(data.getbuffer()).decode('ascii')
@@ -948,19 +1921,13 @@ class WordCloud(object):
             )
 
         # For each word in layout
+        glyphs = self._get_glyphs()
         for (word, count), font_size, (y, x), orientation, color in self.layout_:
             x *= self.scale
             y *= self.scale
 
-            # Get text metrics
-            font = ImageFont.truetype(self.font_path, int(font_size * self.scale))
-            (size_x, size_y), (offset_x, offset_y) = font.font.getsize(word)
-            ascent, descent = font.getmetrics()
-
-            # Compute text bounding box
-            min_x = -offset_x
-            max_x = size_x - offset_x
-            max_y = ascent - offset_y
+            # Get text bounding box
+            min_x, max_x, max_y = glyphs.metrics(word, int(font_size * self.scale))
 
             # Compute text attributes
             attributes = {}
@@ -986,7 +1953,7 @@ class WordCloud(object):
                 .format(
                     transform,
                     font_size * self.scale,
-                    color,
+                    self._css_color(color),
                     saxutils.escape(word)
                 )
             )
@@ -995,7 +1962,6 @@ class WordCloud(object):
 
         # Complete SVG file
         result.append('</svg>')
-        return '\n'.join(result)
 
     def _get_bolean_mask(self, mask):
         """Cast to two dimensional boolean mask."""
@@ -1011,32 +1977,59 @@ class WordCloud(object):
             raise ValueError("Got mask of invalid shape: %s" % str(mask.shape))
         return boolean_mask
 
-    def _draw_contour(self, img):
-        """Draw mask contour on a pillow image."""
+    def _get_contour(self, region):
+        """Flat indices of the mask contour pixels in the region (top, left,
+        bottom, right) of the image, None if no contour is drawn.
+
+        The contour of the whole image is cached until the mask, ``scale`` or
+        ``contour_width`` change, including changes of the mask in place.
+        """
         if self.mask is None or self.contour_width == 0:
-            return img
+            return None
+        full_width, full_height = self._image_size()
+        whole = tuple(region) == (0, 0, full_height, full_width)
+        params = (self.scale, self.contour_width, full_width, full_height,
+                  self._mask_key())
+        cached = self._contour
+        if whole and cached is not None and cached[0] == params:
+            return cached[1]
 
-        mask = self._get_bolean_mask(self.mask) * 255
-        contour = Image.fromarray(mask.astype(np.uint8))
-        contour = contour.resize(img.size)
+        # use gaussian to change width, divide by 10 to give more resolution
+        radius = self.contour_width / 10
+        # the edge filter and the blur need the pixels around the region
+        halo = 3 * (int(radius) + 2) + 1
+        top, left = max(region[0] - halo, 0), max(region[1] - halo, 0)
+        bottom = min(region[2] + halo, full_height)
+        right = min(region[3] + halo, full_width)
+
+        mask = self._get_bolean_mask(self.mask).astype(np.uint8) * 255
+        contour = Image.fromarray(mask)
+        mask_width, mask_height = contour.size
+        contour = contour.resize((right - left, bottom - top),
+                                 box=(left * mask_width / full_width,
+                                      top * mask_height / full_height,
+                                      right * mask_width / full_width,
+                                      bottom * mask_height / full_height))
         contour = contour.filter(ImageFilter.FIND_EDGES)
-        contour = np.array(contour)
 
         # make sure borders are not drawn before changing width
-        contour[[0, -1], :] = 0
-        contour[:, [0, -1]] = 0
+        width, height = contour.size
+        if top == 0:
+            contour.paste(0, (0, 0, width, 1))
+        if bottom == full_height:
+            contour.paste(0, (0, height - 1, width, height))
+        if left == 0:
+            contour.paste(0, (0, 0, 1, height))
+        if right == full_width:
+            contour.paste(0, (width - 1, 0, width, height))
 
-        # use gaussian to change width, divide by 10 to give more resolution
-        radius = self.contour_width / 10
-        contour = Image.fromarray(contour)
         contour = contour.filter(ImageFilter.GaussianBlur(radius=radius))
-        contour = np.array(contour) > 0
-        contour = np.dstack((contour, contour, contour))
-
-        # color the contour
-        ret = np.array(img) * np.invert(contour)
-        if self.contour_color != 'black':
-            color = Image.new(img.mode, img.size, self.contour_color)
-            ret += np.array(color) * contour
-
-        return Image.fromarray(ret)
+        if not whole:
+            contour = contour.crop((region[1] - left, region[0] - top,
+                                    region[3] - left, region[2] - top))
+        indices = np.flatnonzero(np.asarray(contour))
+        if indices.size and indices[-1] < 2 ** 31:
+            indices = indices.astype(np.int32)
+        if whole:
+            self._contour = (params, indices)
+        return indices
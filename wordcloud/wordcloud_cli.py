@@ -19,6 +19,7 @@ if __name__ == '__main__':  # pragma: no cover
         """))
 
 import io
+import os
 import re
 import argparse
 import wordcloud as wc
@@ -85,13 +86,86 @@ class RegExpAction(argparse.Action):
         setattr(namespace, self.dest, values)
 
 
+# options of WordCloud.to_file
+SAVE_OPTIONS = ('format', 'optimize', 'compress_level', 'quality', 'lossless')
+
+
 def main(args, text, imagefile):
+    batch = args.pop('batch', None)
+    n_jobs = args.pop('n_jobs', 1)
+    save_options = {name: args.pop(name) for name in SAVE_OPTIONS
+                    if name in args}
     wordcloud = wc.WordCloud(**args)
-    wordcloud.generate(text)
-    image = wordcloud.to_image()
+    if batch is not None:
+        return main_batch(wordcloud, batch, n_jobs, save_options)
+    if hasattr(text, 'read'):
+        with text:
+            words = wordcloud.process_text(text, n_jobs=n_jobs)
+    else:
+        words = wordcloud.process_text(text, n_jobs=n_jobs)
+    wordcloud.generate_from_frequencies(words)
 
     with imagefile:
-        image.save(imagefile, format='png', optimize=True)
+        wordcloud.to_file(imagefile, **save_options)
+
+
+def read_batch(batchfile):
+    """Read (text file, image file) pairs, one tab separated pair per line.
+
+    If the image file is omitted, the text file name with a ``.png``
+    extension is used.
+    """
+    with batchfile:
+        for line in batchfile:
+            line = line.rstrip('\r\n')
+            if not line.strip():
+                continue
+            text_path, _, image_path = line.partition('\t')
+            if not image_path:
+                image_path = os.path.splitext(text_path)[0] + '.png'
+            yield text_path, image_path
+
+
+def main_batch(wordcloud, batchfile, n_jobs=1, save_options=None):
+    """Generate a word cloud for each job of a batch file in parallel.
+
+    Failed jobs are reported on stderr without stopping the other jobs.
+
+    Returns
+    -------
+    n_failed : int
+        Number of jobs that failed.
+    """
+    n_failed = 0
+    failed = []
+    submitted = []
+
+    def read_texts():
+        # texts are read lazily, as the workers are ready for them
+        for text_path, image_path in read_batch(batchfile):
+            try:
+                with io.open(text_path, encoding='UTF-8') as f:
+                    text = f.read()
+            except (IOError, UnicodeDecodeError) as e:
+                failed.append((text_path, e))
+                continue
+            submitted.append(text_path)
+            yield text, image_path
+
+    def report_failed():
+        n_reported = len(failed)
+        for text_path, error in failed:
+            sys.stderr.write('%s: %s\n' % (text_path, error))
+        del failed[:]
+        return n_reported
+
+    for index, _, error in wc.generate_many(wordcloud, read_texts(),
+                                            n_jobs=n_jobs,
+                                            save_options=save_options):
+        if error is not None:
+            failed.append((submitted[index], error))
+        n_failed += report_failed()
+    return n_failed + report_failed()
 
 
 def make_parser():
@@ -108,10 +182,27 @@ def make_parser():
         help='specify file of stopwords (containing one word per line)'
              ' to remove from the given text after parsing')
     parser.add_argument(
-        '--imagefile', metavar='file', type=FileType('wb'),
-        default='-',
-        help='file the completed PNG image should be written to'
-             ' (default: stdout)')
+        '--imagefile', metavar='file', default=None,
+        help='file the completed image should be written to'
+             ' (default: stdout), not with --batch')
+    parser.add_argument(
+        '--format', metavar='format', default=None,
+        help='image format, e.g. png, jpeg or webp (default: from the'
+             ' image file name, png for stdout)')
+    parser.add_argument(
+        '--compress_level', type=int, default=None, metavar='level',
+        help='zlib compression level of png images, from 0 (fastest) to 9;'
+             ' turns off optimization')
+    parser.add_argument(
+        '--quality', type=int, default=None, metavar='quality',
+        help='quality of jpeg and webp images, from 0 to 100')
+    parser.add_argument(
+        '--lossless', action='store_true',
+        help='write lossless webp images')
+    parser.add_argument(
+        '--no_optimize', action='store_const', const=False, default=None,
+        dest='optimize',
+        help='encode faster, to larger files')
     parser.add_argument(
         '--fontfile', metavar='path', dest='font_path',
         help='path to font file you wish to use (default: DroidSansMono)')
@@ -213,14 +304,26 @@ def make_parser():
         action='store_true',
         dest='repeat',
         help='whether to repeat words and phrases')
+    parser.add_argument(
+        '--batch', metavar='file', type=FileType(),
+        help='generate one image per line of the given file, each line'
+             ' holding a text file and optionally, separated by a tab, the'
+             ' image file to write (default: text file name with .png)')
+    parser.add_argument(
+        '--n_jobs',
+        type=int, default=1, metavar='N',
+        help='number of processes generating the word clouds of --batch, or'
+             ' tokenizing a long --text (default: 1)')
     parser.add_argument(
         '--version', action='version',
         version='%(prog)s {version}'.format(version=__version__))
     return parser
 
 
-def parse_args(arguments):
+def parse_args(arguments, stream_text=False):
     # prog = 'python wordcloud_cli.py'
+    # with stream_text, the --text file is returned open instead of read, for
+    # main to tokenize it chunk by chunk
     parser = make_parser()
     args = parser.parse_args(arguments)
     if args.background_color == 'None':
@@ -229,10 +332,21 @@ def parse_args(arguments):
     if args.colormask and args.color:
         raise ValueError('specify either a color mask or a color function')
 
+    if args.batch and args.imagefile is not None:
+        raise ValueError('specify either a batch file or an image file, the'
+                         ' images of a batch are named in the batch file')
+
     args = vars(args)
 
-    with args.pop('text') as f:
-        text = f.read()
+    if args['batch']:
+        # texts are read from the files listed in the batch file
+        args.pop('text')
+        text = None
+    elif stream_text:
+        text = args.pop('text')
+    else:
+        with args.pop('text') as f:
+            text = f.read()
 
     if args['stopwords']:
         with args.pop('stopwords') as f:
@@ -253,5 +367,12 @@ def parse_args(arguments):
     args['color_func'] = color_func
 
     imagefile = args.pop('imagefile')
+    if not args['batch']:
+        # opened here rather than by argparse, as --batch writes no image
+        # file of its own
+        try:
+            imagefile = FileType('wb')(imagefile or '-')
+        except argparse.ArgumentTypeError as e:
+            parser.error('argument --imagefile: %s' % e)
 
     return args, text, imagefile